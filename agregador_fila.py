@@ -0,0 +1,168 @@
+"""Agregador incremental de la fila global
+
+Mantiene el índice ordenado de segmentos activos, los offsets de numeración
+global (sumas prefijas), los totales y las respuestas JSON ya serializadas.
+Solo se recalcula cuando cambia la versión de los segmentos en el almacén de
+estado o cuando vence el segmento activo más antiguo; mientras tanto todas
+las lecturas son O(1).
+"""
+import json
+import math
+import time
+
+from pronostico_fila import espera_posicion
+
+# Segundos sin datos tras los cuales un segmento deja de contar
+VIGENCIA_SEGMENTO = 10
+
+
+def serializar(valor):
+    """JSON compacto, igual al que genera JSONResponse"""
+    return json.dumps(valor, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class AgregadorFila:
+    """Vista agregada de todos los segmentos, reconstruida solo cuando cambian"""
+
+    def __init__(self, estado, vigencia=VIGENCIA_SEGMENTO):
+        self.almacen = estado
+        self.vigencia = vigencia
+
+        self.generacion = 0     # aumenta con cada reconstrucción
+        self._version = None    # versión de segmentos del almacén ya agregada
+        self._expira = 0.0      # momento en que vence el segmento activo más antiguo
+
+        self._segmentos = {}    # copia superficial: num -> datos
+        self.activos = []       # segmentos activos, en orden
+        self.offsets = {}       # segmento -> personas en los segmentos anteriores
+        self.total = 0
+        self.detalle = {}       # str(segmento) -> personas
+
+        self._cache = {}        # respuestas de la generación actual
+
+    # ACTUALIZACIÓN
+
+    def sincronizar(self, ahora=None):
+        """Reconstruir si el almacén cambió o venció un segmento; True si hubo cambios"""
+        ahora = time.time() if ahora is None else ahora
+        version = self.almacen.version()
+        if version == self._version and ahora < self._expira:
+            return False
+        self._reconstruir(dict(self.almacen.segmentos()), version, ahora)
+        return True
+
+    def _reconstruir(self, segmentos, version, ahora):
+        activos = sorted(
+            num for num, datos in segmentos.items()
+            if ahora - datos.get('last_update', 0) < self.vigencia
+        )
+
+        # Sumas prefijas: offset de cada segmento = personas de los anteriores
+        offsets = {}
+        acumulado = 0
+        for num in activos:
+            offsets[num] = acumulado
+            acumulado += segmentos[num]['personas_count']
+
+        self._segmentos = segmentos
+        self.activos = activos
+        self.offsets = offsets
+        self.total = acumulado
+        self.detalle = {str(num): segmentos[num]['personas_count'] for num in activos}
+
+        self._version = version
+        self._expira = (min(segmentos[num].get('last_update', 0) for num in activos) + self.vigencia
+                        if activos else math.inf)
+        self._cache.clear()
+        self.generacion += 1
+
+    # LECTURAS
+
+    def offset(self, segmento):
+        """Posición global previa al segmento (total si no está activo)"""
+        return self.offsets.get(segmento, self.total)
+
+    def _cacheado(self, clave, construir):
+        valor = self._cache.get(clave)
+        if valor is None:
+            valor = self._cache[clave] = construir()
+        return valor
+
+    def estado(self, tiempo_servicio_min, max_fila):
+        return self._cacheado(('estado', tiempo_servicio_min, max_fila), lambda: {
+            "personas": self.total,
+            "tiempo_espera_min": round(self.total * tiempo_servicio_min, 1),
+            "alerta": self.total > 10,
+            "segmentos_activos": len(self.activos),
+            "detalle_segmentos": self.detalle,
+            "max_fila": max_fila,
+            "en_entrada": 0,
+            "ids_activos": self.total
+        })
+
+    def estado_json(self, tiempo_servicio_min, max_fila):
+        return self._cacheado(('estado_json', tiempo_servicio_min, max_fila),
+                              lambda: serializar(self.estado(tiempo_servicio_min, max_fila)))
+
+    def fila_completa(self, servicio):
+        """servicio = (media, desvío) del tiempo de atención en minutos"""
+        return self._cacheado(('fila', servicio), lambda: self._construir_fila(servicio))
+
+    def fila_completa_json(self, servicio):
+        return self._cacheado(('fila_json', servicio),
+                              lambda: serializar(self.fila_completa(servicio)))
+
+    def fila_camara(self, servicio, camera_id):
+        """Personas de la fila global vistas por una cámara"""
+        return self._cacheado(('fila_camara', servicio, camera_id), lambda: [
+            p for p in self.fila_completa(servicio)['personas'] if p['camera_id'] == camera_id
+        ])
+
+    def segmentos_json(self):
+        return self._cacheado(('segmentos_json',), self._construir_segmentos)
+
+    def _construir_fila(self, servicio):
+        media, desvio = servicio
+        fila_global = []
+        posicion_global = 1
+
+        # Procesar segmentos en orden
+        for seg_num in self.activos:
+            datos = self._segmentos[seg_num]
+
+            for persona in datos['personas']:
+                p50, p90 = espera_posicion(posicion_global, media, desvio)
+                fila_global.append({
+                    'id': posicion_global,
+                    'posicion': posicion_global,
+                    'segmento': seg_num,
+                    'camera_id': datos['camera_id'],
+                    'local_pos': posicion_global,  # Enumeración continua global
+                    'tiempo_espera_min': round(p50, 1),
+                    'tiempo_espera_p90_min': round(p90, 1),
+                    'confianza': persona.get('confianza', 1.0),
+                    'centro_y': persona.get('centro_y', 0)
+                })
+                posicion_global += 1
+
+        return {
+            "total": len(fila_global),
+            "personas": fila_global,
+            "segmentos": {
+                str(seg_num): len(self._segmentos[seg_num]['personas'])
+                for seg_num in self.activos
+            }
+        }
+
+    def _construir_segmentos(self):
+        activos = set(self.activos)
+        resultado = [
+            {
+                "segmento": seg_num,
+                "camera_id": datos['camera_id'],
+                "personas": datos['personas_count'],
+                "activo": seg_num in activos
+            }
+            for seg_num, datos in sorted(self._segmentos.items())
+        ]
+        return serializar({"segmentos": resultado})
@@ -1,14 +1,21 @@
-from fastapi import FastAPI, UploadFile, File, Form, Request
+from fastapi import FastAPI, UploadFile, File, Form, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 import asyncio
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 import uvicorn
 from collections import defaultdict
 import math
+import os
+
+from estado_backend import crear_estado, reiniciar_estado_compartido
+from agregador_fila import AgregadorFila, serializar
+from estadisticas_espera import EstadisticasEspera
+from pronostico_fila import PronosticoFila
+from historico_filas import HistoricoFilas, RESOLUCIONES, ATENCION, pico_por_minuto
 
 app = FastAPI()
 
@@ -23,7 +30,7 @@ app.add_middleware(
 
 # CONFIGURACIÓN
 
-configuracion = {
+CONFIGURACION_INICIAL = {
     "hora_apertura": "08:00",
     "hora_cierre": "18:00",
     "tiempo_atencion_min": 3,
@@ -31,30 +38,114 @@ configuracion = {
     "persona_corte_segunda_ventanilla": 0 
 }
 
-# USAR DICCIONARIOS THREAD-SAFE 
-_segmentos = {}
-_frames = {}
-_camera_last_seen = {}
-_estadisticas = {
-    'fecha': datetime.now().strftime('%Y-%m-%d'),
-    'personas_atendidas': 0,
-    'tiempo_promedio_espera': 0,
-    'pico_fila': 0,
-    'tiempos_espera_acumulados': []
-}
-_queue_ranking = {}
-_personas_historico = {}
-_ultimo_reseteo = datetime.now()
-_alerta_ventanilla_mostrada = False  
 
-# LOCK PARA OPERACIONES CRÍTICAS
+def _estadisticas_vacias():
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d'),
+        'personas_atendidas': 0,
+        'tiempo_promedio_espera': 0,
+        'pico_fila': 0,
+        'espera': EstadisticasEspera().a_dict()    # Welford + P² + buckets por hora
+    }
+
+
+def _registrar_esperas(estadisticas, esperas_min):
+    """Agregar esperas atendidas a las estadísticas (O(1) por persona)"""
+    espera = EstadisticasEspera.desde_dict(estadisticas['espera'])
+    for minutos in esperas_min:
+        espera.agregar(minutos)
+    estadisticas['espera'] = espera.a_dict()
+    estadisticas['personas_atendidas'] += len(esperas_min)
+    estadisticas['tiempo_promedio_espera'] = espera.general.media
+
+
+# HISTÓRICO EN DISCO: largo de fila por minuto, atenciones y resúmenes diarios
+_historico = HistoricoFilas(os.getenv(
+    'FILAS_HISTORICO_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historico')
+))
+
+
+def _estadisticas_del_dia():
+    """Estadísticas de hoy reconstruidas desde el histórico (sobrevive reinicios)"""
+    estadisticas = _estadisticas_vacias()
+    registros = _historico.leer_dia(estadisticas['fecha'])
+    
+    esperas = registros[registros['tipo'] == ATENCION]
+    if len(esperas):
+        espera = EstadisticasEspera()
+        for ts, minutos in zip(esperas['ts'].tolist(), esperas['valor'].tolist()):
+            espera.agregar(minutos, ts)
+        estadisticas['espera'] = espera.a_dict()
+        estadisticas['personas_atendidas'] = espera.general.n
+        estadisticas['tiempo_promedio_espera'] = espera.general.media
+    
+    # Pico aproximado: mayor suma de máximos por segmento en un mismo minuto
+    estadisticas['pico_fila'] = pico_por_minuto(registros)
+    
+    return estadisticas
+
+
+# ESTADO: memoria (un worker) o SQLite compartido (varios workers)
+# Documentos: configuracion, estadisticas, personas_historico, handoffs_pendientes,
+# pronostico, queue_ranking, ultimo_reseteo y alerta_ventanilla_mostrada
+_estado = crear_estado()
+
+with _estado.transaccion():
+    for _clave, _inicial in [
+        ('configuracion', dict(CONFIGURACION_INICIAL)),
+        ('estadisticas', _estadisticas_del_dia()),
+        ('personas_historico', {}),
+        ('handoffs_pendientes', []),
+        ('pronostico', PronosticoFila().a_dict()),
+        ('queue_ranking', {}),
+        ('ultimo_reseteo', datetime.now().isoformat()),
+        ('alerta_ventanilla_mostrada', False),
+    ]:
+        if _estado.leer(_clave) is None:
+            _estado.escribir(_clave, _inicial)
+
+
+def _config():
+    return _estado.leer('configuracion')
+
+
+def _pronostico():
+    return PronosticoFila.desde_dict(_estado.leer('pronostico'))
+
+
+def _servicio():
+    """(media, desvío) en minutos por persona: aprendido, o el configurado si faltan datos"""
+    media, desvio = _pronostico().tiempo_servicio(_config()['tiempo_atencion_min'])
+    return round(media, 2), round(desvio, 2)
+
+
+# Fila global agregada (índice de segmentos, offsets, totales y respuestas serializadas)
+_agregador = AgregadorFila(_estado)
+
+
+def _json(contenido: bytes) -> Response:
+    return Response(content=contenido, media_type="application/json")
+
+
+# LOCK PARA OPERACIONES CRÍTICAS (tracking y reseteos de estadísticas)
 _global_lock = asyncio.Lock()
 
+# Cola de tracking: segmentos con datos nuevos desde el último tick (se coalescen)
+INTERVALO_TRACKING = 1.0    # tick máximo (también detecta segmentos vencidos)
+DEBOUNCE_TRACKING = 0.25    # agrupar ráfagas de posts en un solo tick
+_segmentos_cambiados = set()
+_tracking_pendiente = asyncio.Event()
+
+# Ciclo de vida de cada persona
+GRACIA_HANDOFF = 10         # s para que quien sale por delante de un segmento aparezca en el siguiente
+MIN_ESPERA_ATENCION = 30    # s mínimos en fila para contar una atención
+
 
 # MODELOS
 
 class PersonaSegmento(BaseModel):
     local_pos: int
+    local_id: Optional[int] = None      # ID estable del TrackerSegmento del detector
     centro_y: float
     confianza: Optional[float] = 1.0
 
@@ -84,29 +175,31 @@ async def home():
 async def recibir_segmento(datos: DatosSegmento):
     
     # Actualizar segmento 
-    _segmentos[datos.segmento] = {
+    _estado.guardar_segmento(datos.segmento, {
         "camera_id": datos.camera_id,
         "personas_count": datos.personas_count,
         "personas": [p.dict() for p in datos.personas],
         "timestamp": datos.timestamp,
         "last_update": time.time()
-    }
+    })
+    
+    _agregador.sincronizar()
+    _historico.registrar_longitud(time.time(), datos.segmento, datos.personas_count)
     
     # Actualizar pico
-    total = _calcular_total_personas()
-    if total > _estadisticas['pico_fila']:
-        _estadisticas['pico_fila'] = total
+    total = _agregador.total
+    with _estado.transaccion():
+        estadisticas = _estado.leer('estadisticas')
+        if total > estadisticas['pico_fila']:
+            estadisticas['pico_fila'] = total
+            _estado.escribir('estadisticas', estadisticas)
     
-    asyncio.create_task(_actualizar_tracking_personas())
+    _segmentos_cambiados.add(datos.segmento)
+    _tracking_pendiente.set()
     
-    # Calcular offset para numeración global
-    ahora = time.time()
-    segmentos_ordenados = sorted([s for s in _segmentos.keys() if ahora - _segmentos[s].get('last_update', 0) < 10])
-    offset = 0
-    for s in segmentos_ordenados:
-        if s == datos.segmento:
-            break
-        offset += _segmentos[s]['personas_count']
+    # Offset para numeración global (suma prefija del agregador)
+    offset = _agregador.offset(datos.segmento)
+    _difusor.avisar()
     
     # Print asíncrono 
     asyncio.create_task(_log_async(
@@ -130,157 +223,315 @@ async def actualizar_fila(dato: DatoCamara):
     return await recibir_segmento(datos_seg)
 
 
-def _calcular_total_personas():
-    ahora = time.time()
-    total = 0
-    for datos in _segmentos.values():
-        if ahora - datos.get('last_update', 0) < 10:
-            total += datos['personas_count']
-    return total
+# Sistema automático de detección de personas atendidas
+async def _bucle_tracking():
+    """Único worker de tracking: procesa los segmentos cambiados en cada tick"""
+    while True:
+        try:
+            await asyncio.wait_for(_tracking_pendiente.wait(), INTERVALO_TRACKING)
+        except asyncio.TimeoutError:
+            pass
+        _tracking_pendiente.clear()
+        
+        cambiados = set(_segmentos_cambiados)
+        _segmentos_cambiados.clear()
+        
+        try:
+            async with _global_lock:
+                await _actualizar_tracking_personas(cambiados)
+            _historico.cerrar_minutos()
+            # Escritura y fsync fuera del event loop
+            await asyncio.to_thread(_historico.sincronizar)
+        except Exception as e:
+            print(f"Error en tracking: {e}")
+        
+        await asyncio.sleep(DEBOUNCE_TRACKING)
 
 
-# Sistema automático de detección de personas atendidas
-async def _actualizar_tracking_personas():
+def _clave_persona(camera_id, seg_num, persona):
+    """Clave estable: ID del tracker del detector; posición solo para detectores anteriores"""
+    if persona.get('local_id') is not None:
+        return f"{camera_id}#{persona['local_id']}"
+    return f"{camera_id}_seg{seg_num}_pos{persona['local_pos']}"
+
+
+def _llegada_sin_origen(personas_historico, seg_origen, ahora):
+    """Persona que apareció hace menos de GRACIA_HANDOFF en un segmento anterior a
+    seg_origen sin un handoff que la explique (el más cercano y más antiguo)"""
+    candidatas = [
+        registro
+        for seg, historico_seg in personas_historico.items() if int(seg) < seg_origen
+        for registro in historico_seg.values()
+        if registro.get('llegada_pendiente') and ahora - registro['entrada'] < GRACIA_HANDOFF
+    ]
+    return max(candidatas, key=lambda r: (r['segmento'], -r['entrada']), default=None)
 
-    global _personas_historico, _estadisticas
+
+async def _actualizar_tracking_personas(cambiados):
     
     await _verificar_reseteo_diario()
     
     ahora = time.time()
-    personas_actuales = {}
-    
-    # Obtener todas las personas actuales en fila
-    for seg_num, datos in _segmentos.items():
-        if ahora - datos.get('last_update', 0) < 10:
-            for persona in datos['personas']:
-                # Usar combinación de segmento + posición como ID único
-                persona_id = f"{datos['camera_id']}_seg{seg_num}_pos{persona['local_pos']}"
-                personas_actuales[persona_id] = {
+    segmentos = _estado.segmentos()
+    _agregador.sincronizar(ahora)
+    
+    # El segmento 1 (o el primero activo) es el que llega a la ventanilla;
+    # solo en el último (fondo) se puede entrar a la fila sin venir de otro
+    cabeza = _agregador.activos[0] if _agregador.activos else None
+    fondo = _agregador.activos[-1] if _agregador.activos else None
+    personas_atendidas = []
+    llegadas_confirmadas = []
+    
+    with _estado.transaccion():
+        # Tabla de ciclo de vida por segmento: str(seg) -> {clave: {entrada, ultimo_visto, ...}}
+        personas_historico = _estado.leer('personas_historico')
+        # Personas que salieron por delante de un segmento y aún no aparecieron en el siguiente
+        handoffs_pendientes = _estado.leer('handoffs_pendientes')
+        pronostico = _pronostico()
+        eventos_pronostico = 0
+        
+        # Segmentos que vencieron sin nuevos datos: todas sus personas salieron
+        for clave in list(personas_historico.keys()):
+            datos = segmentos.get(int(clave))
+            if datos is None or ahora - datos.get('last_update', 0) >= 10:
+                cambiados.add(int(clave))
+        
+        # Del fondo hacia la ventanilla, para que un handoff quede pendiente
+        # antes de procesar el segmento que lo recibe
+        for seg_num in sorted(cambiados, reverse=True):
+            datos = segmentos.get(seg_num)
+            historico_seg = personas_historico.get(str(seg_num), {})
+            personas_actuales = {}
+            
+            if datos is not None and ahora - datos.get('last_update', 0) < 10:
+                for persona in datos['personas']:
+                    personas_actuales[_clave_persona(datos['camera_id'], seg_num, persona)] = persona
+            
+            # Salidas: por delante del segmento cabeza = atendida; por delante
+            # de otro segmento = pasa al siguiente; desde otra posición = abandono
+            for clave, registro in list(historico_seg.items()):
+                if clave in personas_actuales:
+                    continue
+                del historico_seg[clave]
+                if registro.pop('llegada_pendiente', False):
+                    llegadas_confirmadas.append(registro['entrada'])
+                
+                if registro['posicion'] != 1:
+                    continue
+                if seg_num == cabeza:
+                    tiempo_espera = ahora - registro['entrada']
+                    # Esperas muy cortas suelen ser cambios de ID del tracker en la cabeza
+                    if tiempo_espera > MIN_ESPERA_ATENCION:
+                        pronostico.registrar_atencion(ahora, _agregador.total)
+                        eventos_pronostico += 1
+                        personas_atendidas.append(tiempo_espera / 60)
+                        _historico.registrar_atencion(ahora, seg_num, tiempo_espera / 60)
+                else:
+                    # La llegada al segmento siguiente pudo procesarse antes que esta salida
+                    llegada = _llegada_sin_origen(personas_historico, seg_num, ahora)
+                    if llegada is not None:
+                        del llegada['llegada_pendiente']
+                        llegada.update({
+                            'entrada': registro['entrada'],
+                            'handoffs': registro['handoffs'] + 1,
+                            'recorrido': registro['recorrido'] + llegada['recorrido']
+                        })
+                    else:
+                        registro['salida'] = ahora
+                        handoffs_pendientes.append(registro)
+            
+            # Llegadas: una persona nueva puede ser la que venía del segmento anterior
+            for clave, persona in personas_actuales.items():
+                registro = historico_seg.get(clave)
+                
+                if registro is None:
+                    # Igual que _llegada_sin_origen: el segmento más cercano y la salida más antigua
+                    origen = min((i for i, p in enumerate(handoffs_pendientes) if p['segmento'] > seg_num),
+                                 key=lambda i: (handoffs_pendientes[i]['segmento'],
+                                                handoffs_pendientes[i]['salida']),
+                                 default=None)
+                    if origen is not None:
+                        registro = handoffs_pendientes.pop(origen)
+                        registro.pop('salida', None)
+                        registro['handoffs'] += 1
+                        registro['recorrido'].append(seg_num)
+                    elif fondo is not None and seg_num < fondo:
+                        # Puede venir de un segmento posterior cuya salida aún no se vio
+                        registro = {'entrada': ahora, 'handoffs': 0, 'recorrido': [seg_num],
+                                    'llegada_pendiente': True}
+                    else:
+                        registro = {'entrada': ahora, 'handoffs': 0, 'recorrido': [seg_num]}
+                        llegadas_confirmadas.append(ahora)
+                    historico_seg[clave] = registro
+                
+                registro.update({
                     'camera_id': datos['camera_id'],
                     'segmento': seg_num,
                     'posicion': persona['local_pos'],
-                    'timestamp': ahora,
+                    'ultimo_visto': ahora,
                     'centro_y': persona['centro_y']
-                }
-    
-    # Registrar nuevas personas
-    for pid, info in personas_actuales.items():
-        if pid not in _personas_historico:
-            _personas_historico[pid] = {
-                'entrada': ahora,
-                'info': info
-            }
-    
-    # Detectar personas que salieron 
-    personas_atendidas = []
-    for pid, data in list(_personas_historico.items()):
-        if pid not in personas_actuales:
-            # Esta persona ya no está en la fila
-            tiempo_espera = ahora - data['entrada']
-            tiempo_espera_min = tiempo_espera / 60
-            
-            # Solo contar si estuvo al menos 30 segundos 
-            if tiempo_espera > 30:
-                personas_atendidas.append(tiempo_espera_min)
-                await _log_async(f"✓ Persona atendida: {tiempo_espera_min:.1f} min de espera")
+                })
             
-            # Eliminar del histórico
-            del _personas_historico[pid]
+            if historico_seg:
+                personas_historico[str(seg_num)] = historico_seg
+            else:
+                personas_historico.pop(str(seg_num), None)
+        
+        # Handoffs que nunca llegaron: la persona dejó la fila
+        vigentes = [p for p in handoffs_pendientes if ahora - p['salida'] < GRACIA_HANDOFF]
+        
+        # Llegadas sin salida que las explique tras la gracia: entraron a la fila ahí
+        for historico_seg in personas_historico.values():
+            for registro in historico_seg.values():
+                if registro.get('llegada_pendiente') and ahora - registro['entrada'] >= GRACIA_HANDOFF:
+                    del registro['llegada_pendiente']
+                    llegadas_confirmadas.append(registro['entrada'])
+        
+        for ts in sorted(llegadas_confirmadas):
+            pronostico.registrar_llegada(ts)
+            eventos_pronostico += 1
+        
+        if cambiados or llegadas_confirmadas or len(vigentes) != len(handoffs_pendientes):
+            _estado.escribir('personas_historico', personas_historico)
+            _estado.escribir('handoffs_pendientes', vigentes)
+        
+        if eventos_pronostico:
+            _estado.escribir('pronostico', pronostico.a_dict())
+        
+        if personas_atendidas:
+            estadisticas = _estado.leer('estadisticas')
+            _registrar_esperas(estadisticas, personas_atendidas)
+            _estado.escribir('estadisticas', estadisticas)
     
     if personas_atendidas:
-        _estadisticas['personas_atendidas'] += len(personas_atendidas)
-        _estadisticas['tiempos_espera_acumulados'].extend(personas_atendidas)
-        
-        if _estadisticas['tiempos_espera_acumulados']:
-            _estadisticas['tiempo_promedio_espera'] = sum(_estadisticas['tiempos_espera_acumulados']) / len(_estadisticas['tiempos_espera_acumulados'])
+        _difusor.avisar()
+    for tiempo_espera_min in personas_atendidas:
+        await _log_async(f"✓ Persona atendida: {tiempo_espera_min:.1f} min de espera")
+
+
+def _estado_actual():
+    _agregador.sincronizar()
+    return _agregador.estado(_servicio()[0], _estado.leer('estadisticas')['pico_fila'])
 
 
 @app.get("/estado-actual")
 async def obtener_estado():
-    ahora = time.time()
-    segmentos_activos = {}
-    
-    for seg_num, datos in _segmentos.items():
-        if ahora - datos.get('last_update', 0) < 10:
-            segmentos_activos[seg_num] = datos
-    
-    total_personas = sum(s['personas_count'] for s in segmentos_activos.values())
-    tiempo_espera = total_personas * configuracion['tiempo_atencion_min']
-    
-    return {
-        "personas": total_personas,
-        "tiempo_espera_min": tiempo_espera,
-        "alerta": total_personas > 10,
-        "segmentos_activos": len(segmentos_activos),
-        "detalle_segmentos": {str(k): v['personas_count'] for k, v in segmentos_activos.items()},
-        "max_fila": _estadisticas['pico_fila'],
-        "en_entrada": 0,
-        "ids_activos": total_personas
-    }
+    _agregador.sincronizar()
+    return _json(_agregador.estado_json(_servicio()[0], _estado.leer('estadisticas')['pico_fila']))
+
+
+def _fila_completa():
+    _agregador.sincronizar()
+    return _agregador.fila_completa(_servicio())
 
 
 @app.get("/fila-completa")
 async def obtener_fila_completa():
+    _agregador.sincronizar()
+    return _json(_agregador.fila_completa_json(_servicio()))
 
-    ahora = time.time()
-    segmentos_activos = {}
-    
-    for seg_num, datos in _segmentos.items():
-        if ahora - datos.get('last_update', 0) < 10:
-            segmentos_activos[seg_num] = datos
-    
-    fila_global = []
-    posicion_global = 1  # ← Empieza en 1
-    
-    # Procesar segmentos en orden 
-    for seg_num in sorted(segmentos_activos.keys()):
-        datos = segmentos_activos[seg_num]
-        
-        # Procesar cada persona del segmento
-        for persona in datos['personas']:
-            fila_global.append({
-                'id': posicion_global,  
-                'posicion': posicion_global,  
-                'segmento': seg_num,
-                'camera_id': datos['camera_id'],
-                'local_pos': posicion_global,  # Cambiado para enumeración continua global
-                'tiempo_espera_min': (posicion_global - 1) * configuracion['tiempo_atencion_min'],  
-                'confianza': persona.get('confianza', 1.0),
-                'centro_y': persona.get('centro_y', 0)
-            })
-            posicion_global += 1  
-    
-    return {
-        "total": len(fila_global),
-        "personas": fila_global,
-        "segmentos": {
-            str(seg): len([p for p in fila_global if p['segmento'] == seg])
-            for seg in segmentos_activos.keys()
-        }
-    }
 
 @app.get("/segmentos")
 async def listar_segmentos():
-    ahora = time.time()
-    resultado = []
+    _agregador.sincronizar()
+    return _json(_agregador.segmentos_json())
+
+
+# ENDPOINTS - FRAMES 
+
+# Tamaño máximo aceptado para un JPEG de cámara
+MAX_FRAME_BYTES = 2 * 1024 * 1024
+
+
+class CanalFrames:
+    """Último frame de una cámara con número de secuencia y aviso a suscriptores"""
+    
+    def __init__(self):
+        self.seq = 0
+        self.chunk = None   # parte multipart ya armada (cabecera + JPEG)
+        self.espectadores = 0
+        self.condicion = asyncio.Condition()
     
-    for seg_num, datos in _segmentos.items():
-        activo = ahora - datos.get('last_update', 0) < 10
-        resultado.append({
-            "segmento": seg_num,
-            "camera_id": datos['camera_id'],
-            "personas": datos['personas_count'],
-            "activo": activo
-        })
+    async def publicar(self, frame: bytes):
+        chunk = b''.join([
+            b'--frame\r\nContent-Type: image/jpeg\r\n',
+            f'Content-Length: {len(frame)}\r\n\r\n'.encode(),
+            frame,
+            b'\r\n'
+        ])
+        async with self.condicion:
+            self.chunk = chunk
+            self.seq += 1
+            self.condicion.notify_all()
     
-    resultado.sort(key=lambda x: x['segmento'])
-    return {"segmentos": resultado}
+    async def esperar(self, seq_visto: int, timeout: float):
+        """Esperar un frame posterior a seq_visto; (seq, chunk) o None si vence"""
+        async with self.condicion:
+            try:
+                await asyncio.wait_for(
+                    self.condicion.wait_for(lambda: self.seq > seq_visto), timeout
+                )
+            except asyncio.TimeoutError:
+                return None
+            return self.seq, self.chunk
 
 
-# ENDPOINTS - FRAMES 
+_canales = {}
+_seq_publicado = {}   # camera_id -> seq del almacén ya publicado en este worker
+
+
+def _canal(camera_id: str) -> CanalFrames:
+    canal = _canales.get(camera_id)
+    if canal is None:
+        canal = _canales[camera_id] = CanalFrames()
+    return canal
+
+
+def _soltar_canal(camera_id: str, canal: CanalFrames):
+    """Quitar el canal de un espectador que se fue si nunca recibió frames"""
+    canal.espectadores -= 1
+    if canal.espectadores == 0 and canal.chunk is None and _canales.get(camera_id) is canal:
+        del _canales[camera_id]
+
+
+async def _guardar_frame(camera_id: str, contents: bytes):
+    if len(contents) > 0:
+        _seq_publicado[camera_id] = _estado.guardar_frame(camera_id, contents, time.time())
+        await _canal(camera_id).publicar(contents)
+
+
+async def _sincronizar_frames():
+    """Con varios workers: publicar aquí los frames que recibió otro worker"""
+    while True:
+        await asyncio.sleep(0.1)
+        try:
+            for camera_id, seq in _estado.frames_seq().items():
+                if seq != _seq_publicado.get(camera_id) and camera_id in _canales:
+                    seq, contents = _estado.frame(camera_id)
+                    _seq_publicado[camera_id] = seq
+                    if contents:
+                        await _canal(camera_id).publicar(contents)
+        except Exception as e:
+            print(f"Error sincronizando frames: {e}")
+
+
+@app.on_event("startup")
+async def _iniciar_tareas():
+    asyncio.create_task(_bucle_tracking())
+    asyncio.create_task(_bucle_eventos())
+    if _estado.multiproceso:
+        asyncio.create_task(_sincronizar_frames())
+
+
+@app.on_event("shutdown")
+async def _cerrar_historico():
+    # fsync bloqueante: fuera del event loop
+    await asyncio.to_thread(_historico.sincronizar, True)
+
 
 @app.post("/upload-frame")
 async def upload_frame(request: Request):
+    """Ingesta multipart (compatibilidad con detectores anteriores)"""
     
     try:
         form = await request.form()
@@ -293,9 +544,7 @@ async def upload_frame(request: Request):
         else:
             contents = file_field if file_field else b''
         
-        if len(contents) > 0:
-            _frames[camera_id] = contents
-            _camera_last_seen[camera_id] = time.time()
+        await _guardar_frame(camera_id, contents)
 
         return Response(status_code=202)  
         
@@ -303,38 +552,95 @@ async def upload_frame(request: Request):
         return Response(status_code=400)
 
 
+@app.put("/frames/{camera_id}")
+async def ingest_frame(camera_id: str, request: Request):
+    """Ingesta binaria: el cuerpo es el JPEG (Content-Type: image/jpeg), sin multipart"""
+    
+    largo = request.headers.get('content-length')
+    
+    # Sin Content-Length (chunked): acumular cortando apenas se pase del límite
+    if largo is None:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) > MAX_FRAME_BYTES:
+                return Response(status_code=413)
+        await _guardar_frame(camera_id, buffer)
+        return Response(status_code=202)
+    
+    try:
+        largo = int(largo)
+    except ValueError:
+        return Response(status_code=400)
+    if largo > MAX_FRAME_BYTES:
+        return Response(status_code=413)
+    
+    # Leer directo a un buffer del tamaño exacto
+    buffer = bytearray(largo)
+    vista = memoryview(buffer)
+    pos = 0
+    async for chunk in request.stream():
+        fin = pos + len(chunk)
+        if fin > largo:
+            return Response(status_code=400)
+        vista[pos:fin] = chunk
+        pos = fin
+    
+    if pos != largo:
+        return Response(status_code=400)
+    
+    # El buffer se entrega tal cual (sin otra copia): nadie más lo modifica
+    await _guardar_frame(camera_id, buffer)
+    return Response(status_code=202)
+
+
+@app.websocket("/ws/frames/{camera_id}")
+async def ingest_frames_ws(websocket: WebSocket, camera_id: str):
+    """Canal persistente de ingesta: cada mensaje binario es un JPEG"""
+    await websocket.accept()
+    try:
+        while True:
+            mensaje = await websocket.receive()
+            if mensaje['type'] == 'websocket.disconnect':
+                break
+            contents = mensaje.get('bytes')
+            if contents is None:
+                # Mensaje de texto: no es un JPEG
+                await websocket.close(code=1003)
+                break
+            if len(contents) <= MAX_FRAME_BYTES:
+                await _guardar_frame(camera_id, contents)
+    except WebSocketDisconnect:
+        pass
+
+
 @app.get('/stream/{camera_id}.mjpg')
 async def mjpeg_stream(camera_id: str):
     
     async def gen():
-        """Generador asíncrono de frames"""
-        last_frame = None
-        no_frame_count = 0
-        
-        while True:
-            frame = _frames.get(camera_id)
+        """Generador asíncrono de frames: despierta solo cuando llega uno nuevo"""
+        canal = _canal(camera_id)
+        canal.espectadores += 1
+        try:
+            seq_visto = 0
+            ultimo_chunk = canal.chunk
             
-            if frame and frame != last_frame:
-                last_frame = frame
-                no_frame_count = 0
-                
-                yield b'--frame\r\n'
-                yield b'Content-Type: image/jpeg\r\n'
-                yield f'Content-Length: {len(frame)}\r\n\r\n'.encode()
-                yield frame
-                yield b'\r\n'
-            
-            elif no_frame_count > 10 and last_frame:
-                yield b'--frame\r\n'
-                yield b'Content-Type: image/jpeg\r\n'
-                yield f'Content-Length: {len(last_frame)}\r\n\r\n'.encode()
-                yield last_frame
-                yield b'\r\n'
-                no_frame_count = 0
-            else:
-                no_frame_count += 1
+            if ultimo_chunk:
+                seq_visto = canal.seq
+                yield ultimo_chunk
             
-            await asyncio.sleep(0.033)  
+            while True:
+                nuevo = await canal.esperar(seq_visto, timeout=0.35)
+                
+                if nuevo:
+                    seq_visto, ultimo_chunk = nuevo
+                    yield ultimo_chunk
+                elif ultimo_chunk:
+                    # Reenviar el último frame para mantener viva la conexión
+                    yield ultimo_chunk
+        finally:
+            # Un camera_id inexistente no debe dejar su canal para siempre
+            _soltar_canal(camera_id, canal)
     
     return StreamingResponse(
         gen(),
@@ -345,14 +651,15 @@ async def mjpeg_stream(camera_id: str):
 @app.get('/cameras')
 async def list_cameras():
     ahora = time.time()
+    camaras = _estado.camaras()
     cameras = [
         {
             "camera_id": cam,
-            "activo": ahora - _camera_last_seen.get(cam, 0) < 5,
-            "last_seen": _camera_last_seen.get(cam),
-            "ultimo_frame": f"{(ahora - _camera_last_seen.get(cam, 0)):.1f}s ago"
+            "activo": ahora - last_seen < 5,
+            "last_seen": last_seen,
+            "ultimo_frame": f"{(ahora - last_seen):.1f}s ago"
         }
-        for cam in _frames.keys()
+        for cam, last_seen in camaras.items()
     ]
     return {"cameras": cameras, "total": len(cameras)}
 
@@ -365,7 +672,11 @@ async def recibir_ranking(data: dict):
         camera_id = data.get('camera_id', 'default')
         personas = data.get('personas', [])
         
-        _queue_ranking[camera_id] = personas
+        with _estado.transaccion():
+            queue_ranking = _estado.leer('queue_ranking')
+            queue_ranking[camera_id] = personas
+            _estado.escribir('queue_ranking', queue_ranking)
+        _difusor.avisar()
         
         return Response(status_code=202)
     except Exception as e:
@@ -374,18 +685,23 @@ async def recibir_ranking(data: dict):
 
 @app.get("/queue-ranking")
 async def obtener_ranking(camera_id: Optional[str] = None):
-    fila = await obtener_fila_completa()
+    return _ranking(camera_id)
+
+
+def _ranking(camera_id: Optional[str] = None):
+    fila = _fila_completa()
     
     if fila['total'] > 0:
         if camera_id:
-            personas = [p for p in fila['personas'] if p['camera_id'] == camera_id]
+            personas = _agregador.fila_camara(_servicio(), camera_id)
         else:
             personas = fila['personas']
         return {"camera_id": camera_id or "global", "personas": personas, "total": len(personas)}
     
+    queue_ranking = _estado.leer('queue_ranking')
     if not camera_id:
-        camera_id = list(_queue_ranking.keys())[0] if _queue_ranking else None
-    ranking = _queue_ranking.get(camera_id, [])
+        camera_id = list(queue_ranking.keys())[0] if queue_ranking else None
+    ranking = queue_ranking.get(camera_id, [])
     
     return {"camera_id": camera_id, "personas": ranking, "total": len(ranking)}
 
@@ -397,23 +713,28 @@ async def atender_persona_manual(data: dict):
     Endpoint manual para registrar una persona atendida
     Útil si quieres un botón en el frontend
     """
-    global _estadisticas
-    
-    tiempo_espera = data.get('tiempo_espera_min', configuracion['tiempo_atencion_min'])
+    tiempo_espera = data.get('tiempo_espera_min', _config()['tiempo_atencion_min'])
     
-    _estadisticas['personas_atendidas'] += 1
-    _estadisticas['tiempos_espera_acumulados'].append(tiempo_espera)
-    
-    # Recalcular promedio
-    if _estadisticas['tiempos_espera_acumulados']:
-        _estadisticas['tiempo_promedio_espera'] = sum(_estadisticas['tiempos_espera_acumulados']) / len(_estadisticas['tiempos_espera_acumulados'])
+    with _estado.transaccion():
+        estadisticas = _estado.leer('estadisticas')
+        _registrar_esperas(estadisticas, [tiempo_espera])
+        _estado.escribir('estadisticas', estadisticas)
+        
+        # Con cámaras activas la atención ya la registra el tracking automático
+        _agregador.sincronizar()
+        if not _agregador.activos:
+            pronostico = _pronostico()
+            pronostico.registrar_atencion(time.time(), _agregador.total)
+            _estado.escribir('pronostico', pronostico.a_dict())
+    _historico.registrar_atencion(time.time(), 0, float(tiempo_espera))
+    _difusor.avisar()
     
     await _log_async(f"✓ Persona atendida manualmente: {tiempo_espera} min")
     
     return {
         "status": "ok",
-        "personas_atendidas": _estadisticas['personas_atendidas'],
-        "tiempo_promedio": round(_estadisticas['tiempo_promedio_espera'], 2)
+        "personas_atendidas": estadisticas['personas_atendidas'],
+        "tiempo_promedio": round(estadisticas['tiempo_promedio_espera'], 2)
     }
 
 
@@ -421,9 +742,13 @@ async def atender_persona_manual(data: dict):
 
 @app.get("/config")
 async def obtener_config():
-    global _alerta_ventanilla_mostrada
+    return _config_respuesta()
+
+
+def _config_respuesta():
     
-    estado = await obtener_estado()
+    estado = _estado_actual()
+    configuracion = _config()
     
     ahora = datetime.now()
     try:
@@ -433,7 +758,9 @@ async def obtener_config():
     except:
         minutos_hasta_cierre = 0
     
-    tiempo_por_persona = configuracion['tiempo_atencion_min']
+    # Tiempo por persona aprendido de las atenciones (el configurado hasta tener datos)
+    pronostico = _pronostico()
+    tiempo_por_persona, _ = pronostico.tiempo_servicio(configuracion['tiempo_atencion_min'])
     personas_en_cola = estado['personas']
     personas_estimadas = (
     math.ceil(minutos_hasta_cierre / tiempo_por_persona)
@@ -444,11 +771,14 @@ async def obtener_config():
     # Calcular si hay alerta
     alerta_nueva_ventanilla = personas_estimadas < personas_en_cola
 
-    if alerta_nueva_ventanilla and not _alerta_ventanilla_mostrada:
-        _alerta_ventanilla_mostrada = True
-    
-    if not alerta_nueva_ventanilla:
-        _alerta_ventanilla_mostrada = False
+    with _estado.transaccion():
+        alerta_ventanilla_mostrada = _estado.leer('alerta_ventanilla_mostrada')
+        if alerta_nueva_ventanilla and not alerta_ventanilla_mostrada:
+            alerta_ventanilla_mostrada = True
+        
+        if not alerta_nueva_ventanilla:
+            alerta_ventanilla_mostrada = False
+        _estado.escribir('alerta_ventanilla_mostrada', alerta_ventanilla_mostrada)
     
     return {
         "config": configuracion,
@@ -460,11 +790,32 @@ async def obtener_config():
             "personas_excedentes": max(0, personas_en_cola - personas_estimadas),  # ← NUEVO
             "persona_corte": personas_estimadas,  # ← NUEVO: desde qué # van a ventanilla 2
             "segunda_ventanilla_activa": configuracion['segunda_ventanilla_activa'],  # ← NUEVO
-            "alerta_pendiente": _alerta_ventanilla_mostrada and alerta_nueva_ventanilla  # ← NUEVO
+            "alerta_pendiente": alerta_ventanilla_mostrada and alerta_nueva_ventanilla,  # ← NUEVO
+            "tiempo_servicio_min": round(tiempo_por_persona, 2),
+            "tasa_llegada_hora": round(pronostico.tasa_llegada() * 60, 1),
+            "minutos_hasta_alerta": _redondear(pronostico.minutos_hasta_alerta(
+                personas_en_cola, minutos_hasta_cierre,
+                2 if configuracion['segunda_ventanilla_activa'] else 1,
+                configuracion['tiempo_atencion_min']
+            ))
         }
     }
 
 
+def _redondear(valor, decimales=0):
+    return None if valor is None else round(valor, decimales)
+
+
+def _actualizar_config(**cambios):
+    """Modificar la configuración compartida; devuelve la nueva"""
+    with _estado.transaccion():
+        configuracion = _config()
+        configuracion.update(cambios)
+        _estado.escribir('configuracion', configuracion)
+    _difusor.avisar()
+    return configuracion
+
+
 @app.post("/config/schedule")
 async def actualizar_schedule(data: dict):
     try:
@@ -477,8 +828,7 @@ async def actualizar_schedule(data: dict):
         datetime.strptime(apertura, '%H:%M')
         datetime.strptime(cierre, '%H:%M')
         
-        configuracion['hora_apertura'] = apertura
-        configuracion['hora_cierre'] = cierre
+        configuracion = _actualizar_config(hora_apertura=apertura, hora_cierre=cierre)
         
         await _log_async(f"Horarios actualizados: {apertura} - {cierre}")
         return {"status": "ok", "config": configuracion}
@@ -500,7 +850,7 @@ async def actualizar_tiempo_atencion(data: dict):
         if minutos <= 0:
             return {"status": "error", "message": "El tiempo debe ser > 0"}
         
-        configuracion['tiempo_atencion_min'] = minutos
+        configuracion = _actualizar_config(tiempo_atencion_min=minutos)
         
         await _log_async(f"Tiempo de atención: {minutos} min")
         return {"status": "ok", "config": configuracion}
@@ -511,19 +861,22 @@ async def actualizar_tiempo_atencion(data: dict):
 # Endpoint para activar/desactivar segunda ventanilla
 @app.post("/config/segunda-ventanilla")
 async def activar_segunda_ventanilla(data: dict):
-
-    global _alerta_ventanilla_mostrada
     
     try:
         activar = data.get('activar', False)
         persona_corte = data.get('persona_corte', 0)
         
-        configuracion['segunda_ventanilla_activa'] = activar
-        configuracion['persona_corte_segunda_ventanilla'] = persona_corte
+        with _estado.transaccion():
+            configuracion = _actualizar_config(
+                segunda_ventanilla_activa=activar,
+                persona_corte_segunda_ventanilla=persona_corte
+            )
+            
+            # Marcar que la alerta fue atendida
+            if activar:
+                _estado.escribir('alerta_ventanilla_mostrada', False)
         
-        # Marcar que la alerta fue atendida
         if activar:
-            _alerta_ventanilla_mostrada = False
             await _log_async(f"✓ Segunda ventanilla ACTIVADA - Corte en persona #{persona_corte}")
         else:
             await _log_async(f"✓ Segunda ventanilla DESACTIVADA")
@@ -541,7 +894,12 @@ async def activar_segunda_ventanilla(data: dict):
 
 @app.get("/estadisticas")
 async def obtener_estadisticas():
-    stats = _estadisticas.copy()
+    return _estadisticas_respuesta()
+
+
+def _estadisticas_respuesta():
+    stats = dict(_estado.leer('estadisticas'))
+    configuracion = _config()
     
     ahora = datetime.now()
     hora_apertura = datetime.strptime(configuracion['hora_apertura'], '%H:%M').time()
@@ -570,32 +928,32 @@ async def obtener_estadisticas():
         stats['estado_ventanilla'] = 'ABIERTA'
         stats['minutos_hasta_cierre'] = int((cierre_dt - ahora).total_seconds() / 60)
     
-    estado = await obtener_estado()
+    estado = _estado_actual()
     stats['personas_actuales'] = estado['personas']
     stats['segmentos_activos'] = estado['segmentos_activos']
     
     stats['tiempo_promedio_espera'] = round(stats['tiempo_promedio_espera'], 1)
     
-    if 'tiempos_espera_acumulados' in stats:
-        del stats['tiempos_espera_acumulados']
+    # Distribución de la espera en lugar del estado interno de los estimadores
+    espera = EstadisticasEspera.desde_dict(stats.pop('espera')).resumen()
+    stats['desvio_espera'] = round(espera['desvio'], 1)
+    stats['percentiles_espera'] = {p: round(espera[p], 1) for p in ('p50', 'p90', 'p99')}
+    stats['espera_por_hora'] = espera['por_hora']
     
     return stats
 
 
 @app.post("/estadisticas/reset")
 async def resetear_estadisticas():
-    global _estadisticas, _personas_historico
     
-    _estadisticas = {
-        'fecha': datetime.now().strftime('%Y-%m-%d'),
-        'personas_atendidas': 0,
-        'tiempo_promedio_espera': 0,
-        'pico_fila': 0,
-        'tiempos_espera_acumulados': []
-    }
-    
-    _segmentos.clear()
-    _personas_historico.clear()
+    # Sin tick de tracking en curso mientras se limpia
+    async with _global_lock:
+        with _estado.transaccion():
+            _estado.escribir('estadisticas', _estadisticas_vacias())
+            _estado.limpiar_segmentos()
+            _estado.escribir('personas_historico', {})
+            _estado.escribir('handoffs_pendientes', [])
+    _difusor.avisar()
     
     await _log_async("Estadísticas reseteadas")
     return {"status": "ok"}
@@ -603,26 +961,25 @@ async def resetear_estadisticas():
 
 # Verificación automática de reseteo diario
 async def _verificar_reseteo_diario():
-
-    global _estadisticas, _personas_historico, _ultimo_reseteo
     
     ahora = datetime.now()
+    ultimo_reseteo = datetime.fromisoformat(_estado.leer('ultimo_reseteo'))
     
     # Resetear a medianoche 
-    if ahora.date() > _ultimo_reseteo.date():
+    if ahora.date() > ultimo_reseteo.date():
         await _log_async(f" Nuevo día detectado: {ahora.date()}")
         await _resetear_estadisticas_interno()
         return
     
     # Resetear después de la hora de cierre
     try:
-        hora_cierre = datetime.strptime(configuracion['hora_cierre'], '%H:%M').time()
+        hora_cierre = datetime.strptime(_config()['hora_cierre'], '%H:%M').time()
         cierre_dt = datetime.combine(ahora.date(), hora_cierre)
         
         if ahora >= cierre_dt:
             ultimo_cierre_hoy = datetime.combine(ahora.date(), hora_cierre)
             
-            if _ultimo_reseteo < ultimo_cierre_hoy:
+            if ultimo_reseteo < ultimo_cierre_hoy:
                 await _log_async(f" Hora de cierre alcanzada: {hora_cierre}")
                 await _resetear_estadisticas_interno()
                 return
@@ -632,32 +989,260 @@ async def _verificar_reseteo_diario():
 
 async def _resetear_estadisticas_interno():
     """Resetear estadísticas internamente (llamado por verificación automática)"""
-    global _estadisticas, _personas_historico, _ultimo_reseteo
     
-    # Guardar estadísticas del día anterior 
-    stats_anteriores = _estadisticas.copy()
+    # Guardar estadísticas del día anterior; otro worker pudo adelantarse
+    with _estado.transaccion():
+        ultimo_reseteo = datetime.fromisoformat(_estado.leer('ultimo_reseteo'))
+        if datetime.now() - ultimo_reseteo < timedelta(seconds=5):
+            return
+        stats_anteriores = _estado.leer('estadisticas')
+        resumen_espera = EstadisticasEspera.desde_dict(stats_anteriores['espera']).resumen()
+        
+        # Resetear estadísticas
+        _estado.escribir('estadisticas', _estadisticas_vacias())
+        _estado.escribir('personas_historico', {})
+        _estado.escribir('handoffs_pendientes', [])
+        _estado.escribir('ultimo_reseteo', datetime.now().isoformat())
+    
+    _historico.guardar_resumen({
+        'fecha': stats_anteriores['fecha'],
+        'personas_atendidas': stats_anteriores['personas_atendidas'],
+        'tiempo_promedio_espera': round(stats_anteriores.get('tiempo_promedio_espera', 0), 2),
+        'percentiles_espera': {p: round(resumen_espera[p], 2) for p in ('p50', 'p90', 'p99')},
+        'pico_fila': stats_anteriores['pico_fila'],
+        'espera_por_hora': resumen_espera['por_hora']
+    })
+    
     await _log_async(f"""
 
     RESUMEN DEL DÍA: {stats_anteriores['fecha']}
 
     Personas Atendidas: {stats_anteriores['personas_atendidas']}
     Tiempo Promedio: {stats_anteriores.get('tiempo_promedio_espera', 0):.1f} min
+    Espera P50 / P90 / P99: {resumen_espera['p50']:.1f} / {resumen_espera['p90']:.1f} / {resumen_espera['p99']:.1f} min
     Pico Máximo: {stats_anteriores['pico_fila']} personas
     """)
     
-    # Resetear estadísticas
-    _estadisticas = {
-        'fecha': datetime.now().strftime('%Y-%m-%d'),
-        'personas_atendidas': 0,
-        'tiempo_promedio_espera': 0,
-        'pico_fila': 0,
-        'tiempos_espera_acumulados': []
+    await _log_async("Estadísticas reseteadas automáticamente")
+
+
+# ENDPOINTS - HISTÓRICO
+
+def _parsear_instante(valor: Optional[str], defecto: float) -> float:
+    """Epoch en segundos, fecha AAAA-MM-DD o fecha-hora ISO"""
+    if not valor:
+        return defecto
+    try:
+        return float(valor)
+    except ValueError:
+        return datetime.fromisoformat(valor).timestamp()
+
+
+@app.get("/historico")
+async def obtener_historico(desde: Optional[str] = None, hasta: Optional[str] = None,
+                            resolucion: str = '1h'):
+    """Largo de fila y atenciones agregados por bucket (últimos 7 días por defecto)"""
+    if resolucion not in RESOLUCIONES:
+        return {"status": "error", "message": f"Resolución inválida; usar {', '.join(RESOLUCIONES)}"}
+    
+    ahora = time.time()
+    try:
+        inicio = _parsear_instante(desde, ahora - 7 * 86400)
+        fin = _parsear_instante(hasta, ahora)
+    except ValueError as e:
+        return {"status": "error", "message": f"Formato inválido: {str(e)}"}
+    
+    # Lo aún no escrito se toma de memoria (sin forzar fsync); el rollup, que
+    # puede leer varios días de disco, corre fuera del event loop
+    instantanea = _historico.instantanea()
+    serie = await asyncio.to_thread(_historico.consultar, inicio, fin, resolucion, instantanea)
+    resumenes = _historico.resumenes(
+        datetime.fromtimestamp(inicio).strftime('%Y-%m-%d'),
+        datetime.fromtimestamp(fin).strftime('%Y-%m-%d')
+    )
+    
+    return {
+        "desde": inicio,
+        "hasta": fin,
+        "resolucion": resolucion,
+        "serie": serie,
+        "resumenes": resumenes
     }
+
+
+# ENDPOINTS - EVENTOS (push al dashboard)
+
+INTERVALO_EVENTOS = 0.5         # como máximo un envío por intervalo (coalescencia)
+INTERVALO_REFRESCO = 1.0        # recalcular aunque nadie avise (otros workers, reloj)
+TIMEOUT_ENVIO_CLIENTE = 5.0     # cliente (SSE o WebSocket) que no consume en este tiempo se desconecta
+TIMEOUT_PING = 15.0             # mantener viva la conexión sin cambios
+
+
+class DifusorEventos:
+    """Última versión serializada de cada tema y aviso a los suscriptores
+    
+    Cada cliente solo recuerda la última versión que vio: si se atrasa recibe
+    el estado más reciente de cada tema, nunca una cola de estados intermedios.
+    """
     
-    _personas_historico.clear()
-    _ultimo_reseteo = datetime.now()
+    def __init__(self):
+        self.temas = {}         # tema -> (version, bytes JSON)
+        self.version = 0
+        self.suscriptores = 0
+        self.condicion = asyncio.Condition()
+        self.cambios = asyncio.Event()
     
-    await _log_async("Estadísticas reseteadas automáticamente")
+    def avisar(self):
+        """Marcar que el estado cambió; se publica en el próximo tick"""
+        self.cambios.set()
+    
+    async def publicar(self, snapshot: dict):
+        cambiados = False
+        for tema, datos in snapshot.items():
+            anterior = self.temas.get(tema)
+            if anterior is None or anterior[1] != datos:
+                self.version += 1
+                self.temas[tema] = (self.version, datos)
+                cambiados = True
+        
+        if cambiados:
+            async with self.condicion:
+                self.condicion.notify_all()
+    
+    async def esperar(self, version_vista: int, timeout: float):
+        """(version, [(tema, datos)]) con lo posterior a version_vista, o None si vence"""
+        async with self.condicion:
+            try:
+                await asyncio.wait_for(
+                    self.condicion.wait_for(lambda: self.version > version_vista), timeout
+                )
+            except asyncio.TimeoutError:
+                return None
+            nuevos = [(tema, datos) for tema, (v, datos) in self.temas.items() if v > version_vista]
+            return self.version, nuevos
+    
+    async def suscribir(self):
+        self.suscriptores += 1
+        if self.suscriptores == 1:
+            # Sin suscriptores no se publicaba: el primer cliente necesita el estado actual
+            await self.publicar(_snapshot_eventos())
+    
+    def desuscribir(self):
+        self.suscriptores -= 1
+
+
+_difusor = DifusorEventos()
+
+
+def _snapshot_eventos():
+    """Respuestas actuales de los endpoints que consulta el dashboard"""
+    _agregador.sincronizar()
+    return {
+        "estado": _agregador.estado_json(_servicio()[0], _estado.leer('estadisticas')['pico_fila']),
+        "segmentos": _agregador.segmentos_json(),
+        "ranking": serializar(_ranking()),
+        "config": serializar(_config_respuesta()),
+        "estadisticas": serializar(_estadisticas_respuesta()),
+    }
+
+
+async def _bucle_eventos():
+    """Un solo cálculo por tick para todos los clientes conectados a este worker"""
+    while True:
+        try:
+            await asyncio.wait_for(_difusor.cambios.wait(), INTERVALO_REFRESCO)
+        except asyncio.TimeoutError:
+            pass
+        _difusor.cambios.clear()
+        
+        if _difusor.suscriptores:
+            try:
+                await _difusor.publicar(_snapshot_eventos())
+            except Exception as e:
+                print(f"Error publicando eventos: {e}")
+        
+        await asyncio.sleep(INTERVALO_EVENTOS)
+
+
+class RespuestaEventos(StreamingResponse):
+    """StreamingResponse con límite por envío: un cliente SSE que no consume se desconecta"""
+    
+    async def stream_response(self, send):
+        async def enviar(mensaje):
+            await asyncio.wait_for(send(mensaje), TIMEOUT_ENVIO_CLIENTE)
+        
+        try:
+            await super().stream_response(enviar)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Cerrar el generador ya: libera la suscripción sin esperar al GC
+            await self.body_iterator.aclose()
+
+
+@app.get("/events")
+async def eventos(request: Request):
+    """Server-Sent Events: un evento por tema (estado, segmentos, ranking, config, estadisticas) al cambiar"""
+    
+    async def gen():
+        try:
+            await _difusor.suscribir()
+            version_vista = 0
+            yield b'retry: 3000\n\n'
+            
+            while not await request.is_disconnected():
+                nuevo = await _difusor.esperar(version_vista, timeout=TIMEOUT_PING)
+                
+                if nuevo is None:
+                    yield b': ping\n\n'
+                    continue
+                
+                version_vista, temas = nuevo
+                yield b''.join(
+                    b'event: ' + tema.encode() + b'\ndata: ' + datos + b'\n\n'
+                    for tema, datos in temas
+                )
+        finally:
+            _difusor.desuscribir()
+    
+    return RespuestaEventos(
+        gen(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.websocket("/ws/events")
+async def eventos_ws(websocket: WebSocket):
+    """Mismos eventos por WebSocket: {"evento": tema, "datos": {...}}"""
+    await websocket.accept()
+    try:
+        await _difusor.suscribir()
+        version_vista = 0
+        
+        while True:
+            nuevo = await _difusor.esperar(version_vista, timeout=TIMEOUT_PING)
+            
+            if nuevo is None:
+                mensajes = [b'{"evento":"ping"}']
+            else:
+                version_vista, temas = nuevo
+                mensajes = [
+                    b'{"evento":"' + tema.encode() + b'","datos":' + datos + b'}'
+                    for tema, datos in temas
+                ]
+            
+            # Límite por cliente: si no consume, se lo desconecta
+            for mensaje in mensajes:
+                await asyncio.wait_for(websocket.send_text(mensaje.decode()), TIMEOUT_ENVIO_CLIENTE)
+    except (WebSocketDisconnect, asyncio.TimeoutError, RuntimeError):
+        pass
+    finally:
+        _difusor.desuscribir()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
 
 # UTILIDADES
@@ -675,8 +1260,9 @@ if __name__ == "__main__":
     import platform
 
     is_windows = platform.system() == 'Windows'
+    workers = int(os.getenv('FILAS_WORKERS', '1' if is_windows else '2'))
     
-    if is_windows:
+    if workers <= 1:
         uvicorn.run(
             app,
             host="0.0.0.0",
@@ -685,11 +1271,14 @@ if __name__ == "__main__":
             timeout_keep_alive=5
         )
     else:
+        # Varios workers: el estado tiene que vivir fuera de cada proceso
+        os.environ['FILAS_ESTADO'] = 'sqlite'
+        reiniciar_estado_compartido()
         uvicorn.run(
             "backend:app",  
             host="0.0.0.0",
             port=8000,
-            workers=2,
+            workers=workers,
             limit_concurrency=100,
             timeout_keep_alive=5
-        )
\ No newline at end of file
+        )
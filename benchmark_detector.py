@@ -0,0 +1,266 @@
+"""Benchmark del pipeline del detector sobre video grabado (sin GUI ni red)
+
+Corre preprocesar → YOLO → filtrar → TrackerSegmento → ordenar lo más rápido
+posible y reporta latencia por etapa (percentiles + histograma), FPS y cambios
+de ID del tracker.
+
+Uso:
+    python benchmark_detector.py --fuente grabacion.mp4 --modelo yolov8n.pt
+    python benchmark_detector.py --fuente frames/ --max-frames 500 --json resultado.json
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+
+from pipeline_segmento import (ZonaFila, TrackerSegmento, filtrar_detecciones, crear_preprocesador,
+                               PlanificadorDeteccion, crear_detector_movimiento,
+                               cargar_modelo, ids_clase, parsear_zona_fila,
+                               agregar_argumentos_pipeline)
+
+ETAPAS = ('lectura', 'movimiento', 'preprocesar', 'yolo', 'filtrar', 'tracker', 'ordenar', 'total')
+ETAPAS_DETECCION = ('preprocesar', 'yolo', 'filtrar')
+
+# Bordes de los buckets del histograma (ms)
+BORDES_MS = (0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, math.inf)
+
+# Frames durante los que un ID perdido puede "reaparecer" con otro número
+VENTANA_CAMBIO_ID = 15
+
+
+# FUENTES DE FRAMES
+
+def _frames_video(ruta):
+    cap = cv2.VideoCapture(ruta)
+    if not cap.isOpened():
+        raise ValueError(f"No se pudo abrir el video {ruta}")
+    try:
+        while True:
+            success, img = cap.read()
+            if not success:
+                return
+            yield img
+    finally:
+        cap.release()
+
+
+def _frames_directorio(ruta):
+    archivos = sorted(
+        f for ext in ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+        for f in glob.glob(os.path.join(ruta, ext))
+    )
+    if not archivos:
+        raise ValueError(f"No hay imágenes en {ruta}")
+    for archivo in archivos:
+        img = cv2.imread(archivo)
+        if img is not None:
+            yield img
+
+
+def abrir_fuente(ruta):
+    return _frames_directorio(ruta) if os.path.isdir(ruta) else _frames_video(ruta)
+
+
+# CAMBIOS DE ID
+
+class ContadorCambiosID:
+    """Cuenta IDs nuevos que aparecen donde hace poco se perdió otro ID"""
+    def __init__(self, distancia_max, ventana=VENTANA_CAMBIO_ID):
+        self.distancia_max = distancia_max
+        self.ventana = ventana
+        self.anteriores = {}
+        self.perdidos = []      # (frame, id, posición)
+        self.ids_creados = 0
+        self.cambios = 0
+
+    def actualizar(self, frame, objetos):
+        actuales = dict(objetos)
+
+        for oid in self.anteriores.keys() - actuales.keys():
+            self.perdidos.append((frame, oid, self.anteriores[oid]))
+        self.perdidos = [p for p in self.perdidos if frame - p[0] <= self.ventana]
+
+        for oid in actuales.keys() - self.anteriores.keys():
+            self.ids_creados += 1
+            x, y = actuales[oid]
+            cercano = next((i for i, (_, _, (px, py)) in enumerate(self.perdidos)
+                            if math.hypot(x - px, y - py) < self.distancia_max), None)
+            if cercano is not None:
+                self.perdidos.pop(cercano)
+                self.cambios += 1
+
+        self.anteriores = actuales
+
+
+# REPORTE
+
+def resumen_etapa(muestras_ms):
+    m = np.asarray(muestras_ms)
+    histograma = np.histogram(m, bins=(0,) + BORDES_MS)[0]
+    return {
+        'media': float(m.mean()),
+        'p50': float(np.percentile(m, 50)),
+        'p90': float(np.percentile(m, 90)),
+        'p99': float(np.percentile(m, 99)),
+        'max': float(m.max()),
+        'histograma': {f"<{b}": int(c) for b, c in zip(BORDES_MS, histograma)}
+    }
+
+
+def imprimir_reporte(resultado):
+    print(f"\n  Modelo: {resultado['modelo']} ({resultado['backend']}, imgsz {resultado['imgsz']}, "
+          f"{resultado['entrada']['recortes']} x {resultado['entrada']['tamano'][0]}x{resultado['entrada']['tamano'][1]})")
+    print(f"  Frames: {resultado['frames']} ({resultado['frames_con_yolo']} con YOLO)  |  FPS: {resultado['fps']:.1f}  |  "
+          f"IDs creados: {resultado['ids_creados']}  |  Cambios de ID: {resultado['cambios_id']}\n")
+    print(f"  {'etapa':<12}{'media':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}   (ms)")
+    for etapa, r in resultado['etapas'].items():
+        print(f"  {etapa:<12}{r['media']:>9.2f}{r['p50']:>9.2f}{r['p90']:>9.2f}{r['p99']:>9.2f}{r['max']:>9.2f}")
+
+    print("\n  Histograma 'total' (ms):")
+    histograma = resultado['etapas']['total']['histograma']
+    mayor = max(histograma.values()) or 1
+    for borde, cantidad in histograma.items():
+        if cantidad:
+            print(f"  {borde:>7} | {'#' * max(1, round(40 * cantidad / mayor))} {cantidad}")
+
+
+# BENCHMARK
+
+def correr(args):
+    zona = ZonaFila(parsear_zona_fila(args.zona_fila))
+    tracker = TrackerSegmento(
+        distancia_fusion=args.distancia_fusion,
+        distancia_max=args.distancia_max,
+        max_disappeared=args.max_disappeared,
+        matching=args.matching
+    )
+    model = cargar_modelo(args.modelo, backend=args.backend, int8=args.int8, imgsz=args.imgsz)
+    preprocesador = crear_preprocesador(args, zona)
+    clases_objetivo = ids_clase(model, "person")
+    cambios_id = ContadorCambiosID(args.distancia_max)
+    planificador = PlanificadorDeteccion(k_max=args.salto_max)
+    movimiento = crear_detector_movimiento(args, zona)
+
+    tiempos = {etapa: [] for etapa in ETAPAS}
+    frames = 0
+    detectados = 0
+    inicio_total = None
+    reloj = time.perf_counter
+
+    fuente = abrir_fuente(args.fuente)
+    while args.max_frames is None or frames < args.max_frames + args.warmup:
+        t0 = reloj()
+        img = next(fuente, None)
+        if img is None:
+            break
+        t1 = reloj()
+        quieta = movimiento is not None and not movimiento.hay_movimiento(img)
+        tm = reloj()
+        detectar = not quieta and planificador.detectar_ahora()
+        if detectar:
+            entradas = preprocesador.entradas(img)
+            t2 = reloj()
+            xyxy, conf, cls = preprocesador.detecciones(model(entradas, verbose=False))
+            t3 = reloj()
+            centros, bboxes, confianzas, _ = filtrar_detecciones(
+                xyxy, conf, cls, args.umbral_confianza, zona,
+                clases_objetivo=clases_objetivo,
+                area_minima=args.area_minima,
+                aspect_min=args.aspect_min,
+                aspect_max=args.aspect_max
+            )
+            t4 = reloj()
+            tracker.actualizar(centros, bboxes, confianzas)
+            planificador.registrar(tracker.velocidades_vistas(), len(centros))
+        else:
+            t2 = t3 = t4 = reloj()
+            if not quieta:
+                tracker.predecir()
+        t5 = reloj()
+        tracker.obtener_personas_ordenadas(zona)
+        t6 = reloj()
+
+        frames += 1
+        cambios_id.actualizar(frames, tracker.objects)
+
+        # Los primeros frames (carga perezosa, caches) no cuentan
+        if frames <= args.warmup:
+            continue
+        if inicio_total is None:
+            inicio_total = t0
+
+        if detectar:
+            detectados += 1
+        intervalos = ((t0, t1), (t1, tm), (tm, t2), (t2, t3), (t3, t4), (t4, t5), (t5, t6), (t0, t6))
+        for etapa, (a, b) in zip(ETAPAS, intervalos):
+            # Las etapas de detección solo se miden en los frames que corren YOLO
+            if etapa in ETAPAS_DETECCION and not detectar:
+                continue
+            if etapa == 'movimiento' and movimiento is None:
+                continue
+            tiempos[etapa].append((b - a) * 1000)
+
+    medidos = len(tiempos['total'])
+    if not medidos:
+        raise ValueError("La fuente no tiene frames suficientes para medir")
+
+    return {
+        'fuente': args.fuente,
+        'modelo': args.modelo,
+        'backend': args.backend + (' int8' if args.int8 else ''),
+        'imgsz': args.imgsz,
+        'entrada': {'recortes': len(preprocesador.recortes), 'tamano': preprocesador.tamano_entrada},
+        'frames': medidos,
+        'frames_con_yolo': detectados,
+        'frames_sin_movimiento': movimiento.salteados if movimiento is not None else 0,
+        'fps': medidos / (reloj() - inicio_total),
+        'ids_creados': cambios_id.ids_creados,
+        'cambios_id': cambios_id.cambios,
+        'etapas': {etapa: resumen_etapa(m) for etapa, m in tiempos.items() if m}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del pipeline del detector (sin GUI ni red)')
+
+    parser.add_argument('--fuente', type=str, required=True,
+                        help='Video o directorio de imágenes')
+
+    parser.add_argument('--modelo', type=str, default='yolov8s.pt',
+                        help='Pesos YOLO a medir (yolov8n.pt, yolov8s.pt, ...)')
+
+    parser.add_argument('--zona-fila', type=str, default=None,
+                        help='Polígono de la zona "x1,y1,x2,y2,..." (por defecto toda la imagen)')
+
+    parser.add_argument('--max-frames', type=int, default=None,
+                        help='Frames a medir (por defecto toda la fuente)')
+
+    parser.add_argument('--warmup', type=int, default=10,
+                        help='Frames iniciales que no se miden')
+
+    parser.add_argument('--json', type=str, default=None,
+                        help='Guardar el resultado en este archivo JSON')
+
+    agregar_argumentos_pipeline(parser)
+    args = parser.parse_args()
+
+    try:
+        resultado = correr(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    imprimir_reporte(resultado)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\n✓ Resultado guardado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
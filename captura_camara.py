@@ -0,0 +1,93 @@
+"""Captura de cámara en un hilo dedicado con buffer de un solo frame"""
+import threading
+import time
+
+import cv2
+
+
+class CapturaCamara:
+    """Lee la cámara continuamente y conserva solo el frame más reciente
+    
+    El bucle de inferencia siempre toma el último frame disponible; los que
+    llegan mientras la inferencia está ocupada se descartan y se cuentan.
+    """
+    def __init__(self, cap, nombre="captura"):
+        self.cap = cap
+        self.nombre = nombre
+        
+        self._condicion = threading.Condition()
+        self._frame = None
+        self._seq = 0               # número del último frame capturado
+        self._seq_entregado = 0     # número del último frame entregado
+        self._activo = False
+        self._hilo = None
+        
+        self.frames_capturados = 0
+        self.frames_descartados = 0
+        self.terminado = False
+    
+    def iniciar(self):
+        # Buffer interno mínimo: no acumular frames viejos en OpenCV
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, name=self.nombre, daemon=True)
+        self._hilo.start()
+        return self
+    
+    def _bucle(self):
+        try:
+            while self._activo:
+                success, img = self.cap.read()
+                
+                with self._condicion:
+                    if not success:
+                        self.terminado = True
+                        self._condicion.notify_all()
+                        break
+                    
+                    # Frame anterior nunca entregado: se descarta
+                    if self._seq > self._seq_entregado:
+                        self.frames_descartados += 1
+                    
+                    self._frame = img
+                    self._seq += 1
+                    self.frames_capturados += 1
+                    self._condicion.notify_all()
+        finally:
+            # Solo este hilo libera la captura: nunca mientras sigue dentro de cap.read()
+            self.cap.release()
+    
+    def leer(self, timeout=5.0):
+        """Esperar un frame nuevo y devolver (success, img)"""
+        limite = time.time() + timeout
+        
+        with self._condicion:
+            while self._seq == self._seq_entregado and not self.terminado:
+                restante = limite - time.time()
+                if restante <= 0:
+                    return False, None
+                self._condicion.wait(restante)
+            
+            if self._seq == self._seq_entregado:
+                return False, None
+            
+            self._seq_entregado = self._seq
+            return True, self._frame
+    
+    def leer_si_hay(self):
+        """Versión no bloqueante de leer(): (False, None) si no hay frame nuevo"""
+        with self._condicion:
+            if self._seq == self._seq_entregado:
+                return False, None
+            self._seq_entregado = self._seq
+            return True, self._frame
+    
+    def detener(self):
+        """Pedir el fin del hilo; si cap.read() está trabado, libera la captura al volver"""
+        self._activo = False
+        if self._hilo is None:
+            self.cap.release()
+            return
+        self._hilo.join(timeout=1.0)
+        if self._hilo.is_alive():
+            print(f"[{self.nombre}] lectura bloqueada: la captura se libera al terminar el hilo")
@@ -0,0 +1,100 @@
+"""Controles remotos del detector (equivalentes al teclado) para modo headless"""
+import json
+import queue
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Acción -> tecla equivalente del modo con ventana
+ACCIONES = {
+    'salir': 'q',
+    'umbral_subir': '+',
+    'umbral_bajar': '-',
+    'zona': 'z',
+    'info': 'i',
+}
+
+
+class ControlDetector:
+    """Cola de controles alimentada por HTTP y señales POSIX
+    
+    El bucle principal consume las teclas con pendientes() en cada frame.
+    """
+    def __init__(self):
+        self._cola = queue.Queue()
+        self._servidor = None
+    
+    def enviar(self, tecla):
+        self._cola.put(tecla)
+    
+    def pendientes(self):
+        """Teclas recibidas desde el último frame"""
+        teclas = []
+        while True:
+            try:
+                teclas.append(self._cola.get_nowait())
+            except queue.Empty:
+                return teclas
+    
+    def instalar_senales(self):
+        """SIGUSR1/SIGUSR2 → umbral +/-, SIGHUP → zona, SIGTERM → salir"""
+        mapa = {
+            'SIGUSR1': 'umbral_subir',
+            'SIGUSR2': 'umbral_bajar',
+            'SIGHUP': 'zona',
+            'SIGTERM': 'salir',
+        }
+        for nombre, accion in mapa.items():
+            sig = getattr(signal, nombre, None)  # No todas existen en Windows
+            if sig is not None:
+                signal.signal(sig, lambda *_, t=ACCIONES[accion]: self.enviar(t))
+    
+    def iniciar_http(self, puerto, host="127.0.0.1"):
+        """POST /control {"accion": "umbral_subir"} o GET /control?accion=zona"""
+        control = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def _responder(self, codigo, cuerpo):
+                data = json.dumps(cuerpo).encode()
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def _procesar(self, accion):
+                if accion not in ACCIONES:
+                    self._responder(400, {"status": "error", "acciones": list(ACCIONES)})
+                    return
+                control.enviar(ACCIONES[accion])
+                self._responder(202, {"status": "ok", "accion": accion})
+            
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != '/control':
+                    self._responder(404, {"status": "error"})
+                    return
+                self._procesar(parse_qs(url.query).get('accion', [None])[0])
+            
+            def do_POST(self):
+                if urlparse(self.path).path != '/control':
+                    self._responder(404, {"status": "error"})
+                    return
+                try:
+                    largo = int(self.headers.get('Content-Length', 0))
+                    accion = json.loads(self.rfile.read(largo) or b'{}').get('accion')
+                except (ValueError, AttributeError):
+                    accion = None
+                self._procesar(accion)
+            
+            def log_message(self, *args):
+                pass
+        
+        self._servidor = ThreadingHTTPServer((host, puerto), Handler)
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+    
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
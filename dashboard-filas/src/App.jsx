@@ -1,9 +1,10 @@
 import React, { useState, useEffect } from 'react';
 import AdminPanel from './components/AdminPanel';
+import { useEventos } from './useEventos';
 import './App.css';
 
 const API_URL = 'http://192.168.0.5:8000';
-const UPDATE_INTERVAL = 1000;
+const REINTENTO_STREAM_MS = 2000;
 
 // 2 CÁMARAS FIJAS
 const CAMARAS_FIJAS = [
@@ -16,12 +17,12 @@ const CameraView = ({ cameraId, title }) => {
   const [cameraOnline, setCameraOnline] = useState(false);
   const [imageKey, setImageKey] = useState(() => Date.now());
 
+  // El MJPEG queda abierto; solo se reconecta si se corta
   useEffect(() => {
-    const interval = setInterval(() => {
-      setImageKey(Date.now());
-    }, 1000);
-    return () => clearInterval(interval);
-  }, []);
+    if (cameraOnline) return;
+    const timeout = setTimeout(() => setImageKey(Date.now()), REINTENTO_STREAM_MS);
+    return () => clearTimeout(timeout);
+  }, [cameraOnline, imageKey]);
 
   return (
     <div className="camera-container">
@@ -52,7 +53,7 @@ const CameraView = ({ cameraId, title }) => {
 
 // COMPONENTE PRINCIPAL: VISTA CLIENTE
 function App() {
-  const [setDatos] = useState({
+  const [, setDatos] = useState({
     personas: 0,
     tiempo_espera_min: 0,
     alerta: false,
@@ -74,62 +75,23 @@ function App() {
   const [mostrarAdmin, setMostrarAdmin] = useState(false);
   const [ranking, setRanking] = useState([]);
 
-  // Obtener datos
-  useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const response = await fetch(`${API_URL}/estado-actual`);
-        const data = await response.json();
-        setDatos(data);
-        setUltimaActualizacion(new Date());
-        setConectado(true);
-      } catch (error) {
-        console.error('Error al obtener datos:', error);
-        setConectado(false);
-      }
-    };
-    fetchData();
-    const interval = setInterval(fetchData, UPDATE_INTERVAL);
-    return () => clearInterval(interval);
-  }, []);
-
-  // Obtener configuración
-  useEffect(() => {
-    const fetchConfig = async () => {
-      try {
-        const response = await fetch(`${API_URL}/config`);
-        const data = await response.json();
-        setConfig({
-          hora_apertura: data.config?.hora_apertura || "09:00",
-          hora_cierre: data.config?.hora_cierre || "17:00",
-          segunda_ventanilla_activa: data.config?.segunda_ventanilla_activa || false,
-          persona_corte_segunda_ventanilla: data.config?.persona_corte_segunda_ventanilla || 0
-        });
-        setEstimado(data.estimado || {});
-      } catch (error) {
-        console.error('Error al obtener configuracion:', error);
-      }
-    };
-    fetchConfig();
-    const interval = setInterval(fetchConfig, 3000);
-    return () => clearInterval(interval);
-  }, []);
-
-  // Obtener ranking de personas en fila
-  useEffect(() => {
-    const fetchRanking = async () => {
-      try {
-        const response = await fetch(`${API_URL}/queue-ranking`);
-        const data = await response.json();
-        setRanking(data.personas || []);
-      } catch (error) {
-        console.error('Error al obtener ranking:', error);
-      }
-    };
-    fetchRanking();
-    const interval = setInterval(fetchRanking, 2000);
-    return () => clearInterval(interval);
-  }, []);
+  // Datos, configuración y ranking empujados por el backend
+  useEventos(API_URL, {
+    estado: (data) => {
+      setDatos(data);
+      setUltimaActualizacion(new Date());
+    },
+    config: (data) => {
+      setConfig({
+        hora_apertura: data.config?.hora_apertura || "09:00",
+        hora_cierre: data.config?.hora_cierre || "17:00",
+        segunda_ventanilla_activa: data.config?.segunda_ventanilla_activa || false,
+        persona_corte_segunda_ventanilla: data.config?.persona_corte_segunda_ventanilla || 0
+      });
+      setEstimado(data.estimado || {});
+    },
+    ranking: (data) => setRanking(data.personas || [])
+  }, setConectado);
 
   const personaDesdeSegundaVentanilla = config.persona_corte_segunda_ventanilla + 1;
 
@@ -1,4 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
+import { useEventos } from '../useEventos';
 
 const API_URL = 'http://192.168.0.5:8000';
 
@@ -59,6 +60,7 @@ function AdminPanel({ onClose }) {
   const [alertaVisible, setAlertaVisible] = useState(true);
   const lastAlertRef = useRef(false);
   const lastAlertStateRef = useRef(false);
+  const ultimaConfigRef = useRef(null);
 
   // Estado de alerta rechazada 
   const alertaActiva = !!estimado?.alerta_nueva_ventanilla;
@@ -78,77 +80,37 @@ function AdminPanel({ onClose }) {
     solicitarPermisoNotificaciones();
   }, []);
 
-  useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const response = await fetch(`${API_URL}/estado-actual`);
-        const data = await response.json();
-        setDatos(data);
-      } catch (error) {
-        console.error('Error:', error);
-      }
-    };
-    fetchData();
-    const interval = setInterval(fetchData, 1000);
-    return () => clearInterval(interval);
-  }, []);
-
-  useEffect(() => {
-    const fetchCamaras = async () => {
-      try {
-        const resp = await fetch(`${API_URL}/segmentos`);
-        const j = await resp.json();
-        const segmentos = j.segmentos || [];
-        let interior = 0, exterior = 0;
-        segmentos.forEach(s => {
-          const cam = (s.camera_id || '').toLowerCase();
-          const personas = s.personas || 0;
-          if (cam.includes('inter') || cam.includes('cam_interior')) interior += personas;
-          else if (cam.includes('exter') || cam.includes('cam_exterior')) exterior += personas;
-        });
-        setCamaraCounts({ interior, exterior });
-      } catch (error) {
-        console.error('Error:', error);
+  // Estado, cámaras, configuración y estadísticas empujados por el backend
+  useEventos(API_URL, {
+    estado: setDatos,
+    segmentos: (j) => {
+      const segmentos = j.segmentos || [];
+      let interior = 0, exterior = 0;
+      segmentos.forEach(s => {
+        const cam = (s.camera_id || '').toLowerCase();
+        const personas = s.personas || 0;
+        if (cam.includes('inter') || cam.includes('cam_interior')) interior += personas;
+        else if (cam.includes('exter') || cam.includes('cam_exterior')) exterior += personas;
+      });
+      setCamaraCounts({ interior, exterior });
+    },
+    config: (data) => {
+      ultimaConfigRef.current = data.config;
+      if (!editandoConfig) {
+        setConfig(data.config || { hora_apertura: "09:00", hora_cierre: "17:00", tiempo_atencion_min: 3 });
       }
-    };
-    fetchCamaras();
-    const t = setInterval(fetchCamaras, 1500);
-    return () => clearInterval(t);
-  }, []);
+      setEstimado(data.estimado || {});
+    },
+    estadisticas: (data) => setEstadisticas(data || {})
+  });
 
+  // Al salir de edición, volver a la última configuración recibida
   useEffect(() => {
-    const fetchConfig = async () => {
-      try {
-        const response = await fetch(`${API_URL}/config`);
-        const data = await response.json();
-        if (!editandoConfig) {
-          setConfig(data.config || { hora_apertura: "09:00", hora_cierre: "17:00", tiempo_atencion_min: 3 });
-        }
-        setEstimado(data.estimado || {});
-      } catch (error) {
-        console.error('Error:', error);
-      }
-    };
-    fetchConfig();
-    const interval = setInterval(fetchConfig, 3000);
-    return () => clearInterval(interval);
+    if (!editandoConfig && ultimaConfigRef.current) {
+      setConfig(ultimaConfigRef.current);
+    }
   }, [editandoConfig]);
 
-  useEffect(() => {
-    const fetchEstadisticas = async () => {
-      try {
-        const response = await fetch(`${API_URL}/estadisticas`);
-        const data = await response.json();
-        setEstadisticas(data || {});
-      } catch (error) {
-        console.error('Error:', error);
-      }
-    };
-    fetchEstadisticas();
-    const interval = setInterval(fetchEstadisticas, 5000);
-    return () => clearInterval(interval);
-  }, []);
-
   // Notificacion del navegador cuando hay alerta
   useEffect(() => {
     if (
@@ -458,6 +420,8 @@ function AdminPanel({ onClose }) {
                 {[
                   { label: 'Personas Atendidas', value: estadisticas.personas_atendidas || 0 },
                   { label: 'Tiempo Promedio', value: `${Math.round(estadisticas.tiempo_promedio_espera || 0)} min` },
+                  { label: 'Espera P50 / P90', value: `${Math.round(estadisticas.percentiles_espera?.p50 || 0)} / ${Math.round(estadisticas.percentiles_espera?.p90 || 0)} min` },
+                  { label: 'Espera P99', value: `${Math.round(estadisticas.percentiles_espera?.p99 || 0)} min` },
                   { label: 'Pico Máximo', value: `${estadisticas.pico_fila || 0} personas` },
                   { label: 'Estado', value: estadisticas.estado_ventanilla || 'N/A' }
                 ].map((stat, idx) => (
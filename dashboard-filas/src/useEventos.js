@@ -0,0 +1,41 @@
+import { useEffect, useRef } from 'react';
+
+// Suscripción a /events (Server-Sent Events): el backend empuja cada tema
+// (estado, segmentos, ranking, config, estadisticas) solo cuando cambia.
+// EventSource reconecta solo si se cae la conexión.
+export function useEventos(apiUrl, manejadores, onConexion) {
+  const manejadoresRef = useRef(manejadores);
+  const onConexionRef = useRef(onConexion);
+
+  // Siempre usar los manejadores del último render sin reabrir la conexión
+  useEffect(() => {
+    manejadoresRef.current = manejadores;
+    onConexionRef.current = onConexion;
+  });
+
+  useEffect(() => {
+    const fuente = new EventSource(`${apiUrl}/events`);
+    const temas = Object.keys(manejadoresRef.current);
+
+    const escuchas = temas.map((tema) => {
+      const escucha = (evento) => {
+        try {
+          const manejador = manejadoresRef.current[tema];
+          if (manejador) manejador(JSON.parse(evento.data));
+        } catch (error) {
+          console.error(`Error en evento ${tema}:`, error);
+        }
+      };
+      fuente.addEventListener(tema, escucha);
+      return [tema, escucha];
+    });
+
+    fuente.onopen = () => onConexionRef.current?.(true);
+    fuente.onerror = () => onConexionRef.current?.(false);
+
+    return () => {
+      escuchas.forEach(([tema, escucha]) => fuente.removeEventListener(tema, escucha));
+      fuente.close();
+    };
+  }, [apiUrl]);
+}
@@ -0,0 +1,308 @@
+"""Detector multi-cámara en un solo proceso con inferencia YOLO en lote
+
+Cada cámara tiene su propio segmento, zona y TrackerSegmento; el modelo se
+carga una sola vez y los últimos frames de todas las cámaras se procesan en
+una única llamada model([...]).
+
+Uso:
+    python detector_multicamara.py --config camaras.json --headless
+    python detector_multicamara.py --camara cam_interior,1,http://192.168.0.4:8080/video \
+                                   --camara cam_exterior,2,http://192.168.0.6:8080/video
+
+camaras.json:
+    {"camaras": [{"camera_id": "cam_interior", "segmento": 1,
+                  "url": "http://192.168.0.4:8080/video",
+                  "zona_fila": "0,0,1280,0,1280,720,0,720"}]}
+"""
+import argparse
+import json
+import time
+
+import cv2
+
+from pipeline_segmento import (ZonaFila, TrackerSegmento, filtrar_detecciones, crear_preprocesador,
+                               PlanificadorDeteccion, crear_detector_movimiento,
+                               cargar_modelo, ids_clase, parsear_zona_fila,
+                               agregar_argumentos_pipeline)
+from captura_camara import CapturaCamara
+from reporte_backend import ReporteBackend
+
+# CONFIGURACIÓN
+
+URL_BACKEND = "http://192.168.0.5:8000"
+INTERVALO_ENVIO = 2
+INTERVALO_FRAME = 5
+
+COLORES_SEGMENTO = {
+    1: (0, 255, 0),      # Verde
+    2: (255, 165, 0),    # Naranja
+    3: (255, 0, 0),      # Rojo
+}
+
+
+# ESTADO POR CÁMARA
+
+class CamaraSegmento:
+    """Cámara + segmento + zona + tracker propios"""
+    def __init__(self, camera_id, segmento, url, zona_fila, args):
+        self.camera_id = camera_id
+        self.segmento = segmento
+        self.url = url
+        self.zona = ZonaFila(parsear_zona_fila(zona_fila))
+        self.preprocesador = crear_preprocesador(args, self.zona)
+        self.tracker = TrackerSegmento(
+            distancia_fusion=args.distancia_fusion,
+            distancia_max=args.distancia_max,
+            max_disappeared=args.max_disappeared,
+            matching=args.matching
+        )
+        self.planificador = PlanificadorDeteccion(k_max=args.salto_max)
+        self.movimiento = crear_detector_movimiento(args, self.zona)
+        self.captura = None
+        self.color = COLORES_SEGMENTO.get(segmento, (255, 255, 255))
+
+        self.global_offset = 0
+        self.ultimo_envio_datos = 0
+        self.ultimo_envio_frame = 0
+
+        self.frame_count = 0
+        self.total_detecciones = 0
+        self.total_filtradas = 0
+
+    def conectar(self):
+        cap = cv2.VideoCapture(self.url)
+        if not cap.isOpened():
+            print(f" No se pudo conectar a {self.url} ({self.camera_id})")
+            return False
+        self.captura = CapturaCamara(cap, nombre=f"captura-{self.camera_id}").iniciar()
+        print(f"Cámara conectada: {self.camera_id} (segmento {self.segmento})")
+        return True
+
+    def publicar(self, reporte, frame, headless):
+        """Ordenar la fila del tracker, dibujar si hay preview y reportar"""
+        personas_ordenadas = self.tracker.obtener_personas_ordenadas(self.zona)
+
+        img = None
+        if not headless:
+            img = self.preprocesador.canonico(frame)
+            self.dibujar(img, personas_ordenadas)
+
+        self.reportar(reporte, frame, img, personas_ordenadas, dibujar=not headless)
+
+        if not headless:
+            cv2.imshow(f"Segmento {self.segmento} - {self.camera_id}", img)
+
+    # COMUNICACIÓN CON BACKEND
+
+    def reportar(self, reporte, frame, img, personas_ordenadas, dibujar):
+        """Encolar datos/frame para el backend cuando toca (nunca bloquea)"""
+        ahora = time.time()
+
+        if ahora - self.ultimo_envio_datos > INTERVALO_ENVIO:
+            datos = {
+                "camera_id": self.camera_id,
+                "segmento": self.segmento,
+                "personas_count": len(personas_ordenadas),
+                "personas": [
+                    {
+                        "local_pos": idx + 1,
+                        "local_id": p["local_id"],
+                        "centro_x": p["centro_x"],
+                        "centro_y": p["centro_y"],
+                        "confianza": p["confianza"]
+                    }
+                    for idx, p in enumerate(personas_ordenadas)
+                ],
+                "timestamp": ahora
+            }
+            reporte.enviar_datos(datos)
+            self.ultimo_envio_datos = ahora
+
+        self.global_offset = reporte.offset(self.camera_id)
+
+        if ahora - self.ultimo_envio_frame > INTERVALO_FRAME:
+            if not dibujar:
+                img = self.preprocesador.canonico(frame)
+                self.dibujar(img, personas_ordenadas)
+            reporte.enviar_frame(self.camera_id, img.copy())
+            self.ultimo_envio_frame = ahora
+
+    # DIBUJO
+
+    def dibujar(self, img, personas_ordenadas):
+        cv2.putText(img, f"SEGMENTO {self.segmento}: {self.camera_id}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, self.color, 2)
+        cv2.polylines(img, [self.zona.puntos], True, self.color, 2)
+
+        for idx, persona in enumerate(personas_ordenadas):
+            bbox = persona['bbox']
+            if bbox:
+                cv2.rectangle(img, (bbox[0], bbox[1]), (bbox[2], bbox[3]), self.color, 2)
+                cv2.putText(img, f"#{idx + 1 + self.global_offset}", (bbox[0] + 4, bbox[1] - 4),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.color, 2)
+            cv2.circle(img, persona['centro'], 5, self.color, -1)
+
+        cv2.putText(img, f'Personas: {len(personas_ordenadas)}', (10, 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+
+# ARGUMENTOS CLI
+
+def _leer_camaras(args):
+    camaras = []
+
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            config = json.load(f)
+        for c in config.get('camaras', []):
+            camaras.append((c['camera_id'], int(c['segmento']), c['url'], c.get('zona_fila')))
+
+    for texto in args.camara:
+        camera_id, seg, url = texto.split(',', 2)
+        camaras.append((camera_id, int(seg), url, None))
+
+    return camaras
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detector Multi-Cámara en un solo proceso')
+
+    parser.add_argument('--config', type=str, default=None,
+                        help='JSON con la lista de cámaras (camera_id, segmento, url, zona_fila)')
+
+    parser.add_argument('--camara', type=str, action='append', default=[],
+                        help='Cámara "camera_id,segmento,url" (repetible)')
+
+    parser.add_argument('--modelo', type=str, default='yolov8s.pt',
+                        help='Pesos YOLO compartidos por todas las cámaras')
+
+    agregar_argumentos_pipeline(parser)
+    args = parser.parse_args()
+
+    try:
+        definiciones = _leer_camaras(args)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(f"Configuración de cámaras inválida: {e}")
+    if not definiciones:
+        parser.error("Indica al menos una cámara con --config o --camara")
+
+    camaras = []
+    for camera_id, seg, url, zona in definiciones:
+        try:
+            camara = CamaraSegmento(camera_id, seg, url, zona, args)
+        except ValueError as e:
+            parser.error(f"{camera_id}: {e}")
+        if camara.conectar():
+            camaras.append(camara)
+
+    if not camaras:
+        print(" Error: No hay camara disponible")
+        return
+
+    # Un solo pool de conexiones al backend para todas las cámaras
+    reporte = ReporteBackend(URL_BACKEND)
+
+    # Un solo modelo para todas las cámaras
+    model = cargar_modelo(args.modelo, backend=args.backend, int8=args.int8, imgsz=args.imgsz)
+    clases_objetivo = ids_clase(model, "person")
+    umbral = args.umbral_confianza
+
+    print(f"""
+  Cámaras: {', '.join(f'{c.camera_id} (seg {c.segmento})' for c in camaras)}
+  Umbral: {umbral}
+  Modo: {'headless' if args.headless else 'preview'}
+""")
+
+    last_diag_time = 0
+    lotes = 0
+
+    try:
+        while camaras:
+            # Recolectar el último frame de cada cámara que tenga uno nuevo
+            lote = []
+            hubo_frames = False
+            for camara in list(camaras):
+                success, img = camara.captura.leer_si_hay()
+                if success:
+                    hubo_frames = True
+                    camara.frame_count += 1
+                    if camara.movimiento is not None and not camara.movimiento.hay_movimiento(img):
+                        # Escena quieta: se reporta el último estado del tracker
+                        camara.publicar(reporte, img, args.headless)
+                    elif camara.planificador.detectar_ahora():
+                        lote.append((camara, img))
+                    else:
+                        # Frame sin YOLO: solo predicción del tracker
+                        camara.tracker.predecir()
+                        camara.publicar(reporte, img, args.headless)
+                elif camara.captura.terminado:
+                    print(f"✗ Error leyendo cámara {camara.camera_id}")
+                    camara.captura.detener()
+                    camaras.remove(camara)
+
+            if not hubo_frames:
+                time.sleep(0.005)
+                continue
+
+            # DETECCIÓN YOLO EN LOTE
+
+            # Una entrada por recorte de cada cámara, todas en la misma llamada
+            entradas = [camara.preprocesador.entradas(frame) for camara, frame in lote]
+            results = model([e for grupo in entradas for e in grupo], verbose=False) if lote else []
+            lotes += bool(lote)
+
+            inicio = 0
+            for (camara, frame), grupo in zip(lote, entradas):
+                xyxy, conf, cls = camara.preprocesador.detecciones(results[inicio:inicio + len(grupo)])
+                inicio += len(grupo)
+                centros, bboxes, confianzas, brutas = filtrar_detecciones(
+                    xyxy, conf, cls, umbral, camara.zona,
+                    clases_objetivo=clases_objetivo,
+                    area_minima=args.area_minima,
+                    aspect_min=args.aspect_min,
+                    aspect_max=args.aspect_max
+                )
+                camara.total_detecciones += brutas
+                camara.total_filtradas += brutas - len(centros)
+
+                # TRACKING
+
+                camara.tracker.actualizar(centros, bboxes, confianzas)
+                camara.planificador.registrar(camara.tracker.velocidades_vistas(), len(centros))
+                camara.publicar(reporte, frame, args.headless)
+
+            # Diagnóstico
+            if time.time() - last_diag_time > INTERVALO_ENVIO:
+                for c in camaras:
+                    print(f"[diag] {c.camera_id} | Frame={c.frame_count} | Tracked={len(c.tracker.objects)} "
+                          f"| Descartados={c.captura.frames_descartados} | K={c.planificador.k}")
+                m = reporte.metricas()
+                print(f"[diag] Lotes={lotes} | Datos enviados={m['datos']['enviados']} "
+                      f"descartados={m['datos']['descartados']} fallidos={m['datos']['fallidos']} "
+                      f"({m['datos']['latencia_ms_promedio']:.0f} ms)")
+                last_diag_time = time.time()
+
+            if not args.headless:
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    break
+                elif key == ord('+') or key == ord('='):
+                    umbral = min(0.95, umbral + 0.05)
+                    print(f"✓ Umbral: {umbral:.2f}")
+                elif key == ord('-'):
+                    umbral = max(0.20, umbral - 0.05)
+                    print(f"✓ Umbral: {umbral:.2f}")
+    except KeyboardInterrupt:
+        pass
+
+    # FINALIZACIÓN
+
+    for camara in camaras:
+        camara.captura.detener()
+    reporte.detener()
+    if not args.headless:
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Estadísticas de espera en streaming (memoria y costo de actualización O(1))
+
+- Welford: cantidad, media y varianza acumuladas
+- P² (Jain y Chlamtac, 1985): estimación de cuantiles con 5 marcadores
+- Buckets por hora del día
+
+Todo se serializa a dict/JSON para guardarlo en el almacén de estado.
+"""
+import math
+from datetime import datetime
+
+CUANTILES = (0.5, 0.9, 0.99)
+
+
+class Welford:
+    """Cantidad, media y varianza sin guardar las muestras"""
+
+    def __init__(self, n=0, media=0.0, m2=0.0):
+        self.n = n
+        self.media = media
+        self.m2 = m2
+
+    def agregar(self, x):
+        self.n += 1
+        delta = x - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (x - self.media)
+
+    @property
+    def varianza(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def desvio(self):
+        return math.sqrt(self.varianza)
+
+    def a_dict(self):
+        return {'n': self.n, 'media': self.media, 'm2': self.m2}
+
+    @classmethod
+    def desde_dict(cls, d):
+        return cls(d['n'], d['media'], d['m2'])
+
+
+class CuantilP2:
+    """Estimador P² de un cuantil p (5 marcadores, sin guardar las muestras)"""
+
+    def __init__(self, p):
+        self.p = p
+        self.q = []                 # alturas de los marcadores (o las primeras 5 muestras)
+        self.pos = [0, 1, 2, 3, 4]  # posiciones reales
+        self.deseadas = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.incrementos = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    @property
+    def n(self):
+        return len(self.q) if len(self.q) < 5 else self.pos[4] + 1
+
+    def agregar(self, x):
+        q = self.q
+
+        # Hasta tener 5 muestras se guardan ordenadas
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Celda donde cae x (ajustando los extremos)
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(1, 5) if x < q[i]) - 1
+
+        for i in range(k + 1, 5):
+            self.pos[i] += 1
+        for i in range(5):
+            self.deseadas[i] += self.incrementos[i]
+
+        # Ajustar los marcadores centrales
+        for i in (1, 2, 3):
+            d = self.deseadas[i] - self.pos[i]
+            if (d >= 1 and self.pos[i + 1] - self.pos[i] > 1) or (d <= -1 and self.pos[i - 1] - self.pos[i] < -1):
+                d = 1 if d > 0 else -1
+                candidato = self._parabolica(i, d)
+                if not q[i - 1] < candidato < q[i + 1]:
+                    candidato = q[i] + d * (q[i + d] - q[i]) / (self.pos[i + d] - self.pos[i])
+                q[i] = candidato
+                self.pos[i] += d
+
+    def _parabolica(self, i, d):
+        q, n = self.q, self.pos
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def valor(self):
+        if not self.q:
+            return 0.0
+        if len(self.q) < 5:
+            # Pocas muestras: cuantil exacto con interpolación lineal
+            h = (len(self.q) - 1) * self.p
+            lo = int(h)
+            hi = min(lo + 1, len(self.q) - 1)
+            return self.q[lo] + (h - lo) * (self.q[hi] - self.q[lo])
+        return self.q[2]
+
+    def a_dict(self):
+        return {'p': self.p, 'q': self.q, 'pos': self.pos, 'deseadas': self.deseadas}
+
+    @classmethod
+    def desde_dict(cls, d):
+        c = cls(d['p'])
+        c.q = list(d['q'])
+        c.pos = list(d['pos'])
+        c.deseadas = list(d['deseadas'])
+        return c
+
+
+class EstadisticasEspera:
+    """Esperas del día: Welford + cuantiles P² + buckets por hora"""
+
+    def __init__(self):
+        self.general = Welford()
+        self.cuantiles = {p: CuantilP2(p) for p in CUANTILES}
+        self.por_hora = {}      # "HH" -> Welford
+
+    def agregar(self, minutos, ts=None):
+        self.general.agregar(minutos)
+        for c in self.cuantiles.values():
+            c.agregar(minutos)
+
+        hora = datetime.fromtimestamp(ts).strftime('%H') if ts else datetime.now().strftime('%H')
+        bucket = self.por_hora.get(hora)
+        if bucket is None:
+            bucket = self.por_hora[hora] = Welford()
+        bucket.agregar(minutos)
+
+    def resumen(self):
+        return {
+            'atendidas': self.general.n,
+            'media': self.general.media,
+            'desvio': self.general.desvio,
+            'p50': self.cuantiles[0.5].valor(),
+            'p90': self.cuantiles[0.9].valor(),
+            'p99': self.cuantiles[0.99].valor(),
+            'por_hora': {
+                hora: {'atendidas': b.n, 'media': round(b.media, 1)}
+                for hora, b in sorted(self.por_hora.items())
+            }
+        }
+
+    def a_dict(self):
+        return {
+            'general': self.general.a_dict(),
+            'cuantiles': [c.a_dict() for c in self.cuantiles.values()],
+            'por_hora': {hora: b.a_dict() for hora, b in self.por_hora.items()}
+        }
+
+    @classmethod
+    def desde_dict(cls, d):
+        e = cls()
+        e.general = Welford.desde_dict(d['general'])
+        for c in d['cuantiles']:
+            e.cuantiles[c['p']] = CuantilP2.desde_dict(c)
+        e.por_hora = {hora: Welford.desde_dict(b) for hora, b in d['por_hora'].items()}
+        return e
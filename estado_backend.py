@@ -0,0 +1,194 @@
+"""Almacenes de estado del backend de filas
+
+EstadoMemoria guarda todo en diccionarios del proceso (un solo worker).
+EstadoSQLite comparte segmentos, frames y documentos (estadísticas,
+configuración, histórico) entre varios workers de uvicorn mediante un
+archivo SQLite local en modo WAL.
+
+Se elige con la variable de entorno FILAS_ESTADO=memoria|sqlite
+(FILAS_ESTADO_RUTA indica el archivo SQLite).
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+class EstadoMemoria:
+    """Estado en memoria del proceso (solo válido con un worker)"""
+
+    multiproceso = False
+
+    def __init__(self):
+        self._segmentos = {}
+        self._frames = {}       # camera_id -> (seq, bytes)
+        self._last_seen = {}    # camera_id -> timestamp
+        self._docs = {}
+        self._version = 0
+
+    # SEGMENTOS
+
+    def guardar_segmento(self, num, datos):
+        self._segmentos[num] = datos
+        self._version += 1
+
+    def segmentos(self):
+        return self._segmentos
+
+    def limpiar_segmentos(self):
+        self._segmentos.clear()
+        self._version += 1
+
+    def version(self):
+        """Contador que cambia con cada escritura de segmentos"""
+        return self._version
+
+    # FRAMES
+
+    def guardar_frame(self, camera_id, contents, ts):
+        seq = self._frames.get(camera_id, (0, None))[0] + 1
+        self._frames[camera_id] = (seq, contents)
+        self._last_seen[camera_id] = ts
+        return seq
+
+    def frame(self, camera_id):
+        """(seq, bytes) del último frame, (0, None) si no hay"""
+        return self._frames.get(camera_id, (0, None))
+
+    def camaras(self):
+        """camera_id -> último timestamp visto"""
+        return self._last_seen
+
+    # DOCUMENTOS
+
+    def leer(self, clave, defecto=None):
+        return self._docs.get(clave, defecto)
+
+    def escribir(self, clave, valor):
+        self._docs[clave] = valor
+
+    @contextmanager
+    def transaccion(self):
+        # Un solo proceso y un solo event loop: nada que bloquear
+        yield self
+
+
+class EstadoSQLite:
+    """Estado compartido entre procesos en un archivo SQLite (WAL)"""
+
+    multiproceso = True
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(ruta, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS segmentos (num INTEGER PRIMARY KEY, datos TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS frames (
+                camera_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, ts REAL NOT NULL, datos BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS docs (clave TEXT PRIMARY KEY, valor TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+            INSERT OR IGNORE INTO meta VALUES ('version_segmentos', 0);
+        """)
+        self._en_transaccion = False
+
+    def _ejecutar(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _incrementar_version(self):
+        self._ejecutar("UPDATE meta SET valor = valor + 1 WHERE clave = 'version_segmentos'")
+
+    # SEGMENTOS
+
+    def guardar_segmento(self, num, datos):
+        with self.transaccion():
+            self._ejecutar("INSERT OR REPLACE INTO segmentos VALUES (?, ?)", (num, json.dumps(datos)))
+            self._incrementar_version()
+
+    def segmentos(self):
+        filas = self._ejecutar("SELECT num, datos FROM segmentos").fetchall()
+        return {num: json.loads(datos) for num, datos in filas}
+
+    def limpiar_segmentos(self):
+        with self.transaccion():
+            self._ejecutar("DELETE FROM segmentos")
+            self._incrementar_version()
+
+    def version(self):
+        return self._ejecutar("SELECT valor FROM meta WHERE clave = 'version_segmentos'").fetchone()[0]
+
+    # FRAMES
+
+    def guardar_frame(self, camera_id, contents, ts):
+        with self.transaccion():
+            fila = self._ejecutar("SELECT seq FROM frames WHERE camera_id = ?", (camera_id,)).fetchone()
+            seq = (fila[0] if fila else 0) + 1
+            self._ejecutar("INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?)",
+                           (camera_id, seq, ts, sqlite3.Binary(contents)))
+        return seq
+
+    def frame(self, camera_id):
+        fila = self._ejecutar("SELECT seq, datos FROM frames WHERE camera_id = ?", (camera_id,)).fetchone()
+        return (fila[0], bytes(fila[1])) if fila else (0, None)
+
+    def frames_seq(self):
+        """camera_id -> seq del último frame (consulta barata, sin los JPEG)"""
+        return dict(self._ejecutar("SELECT camera_id, seq FROM frames").fetchall())
+
+    def camaras(self):
+        return dict(self._ejecutar("SELECT camera_id, ts FROM frames").fetchall())
+
+    # DOCUMENTOS
+
+    def leer(self, clave, defecto=None):
+        fila = self._ejecutar("SELECT valor FROM docs WHERE clave = ?", (clave,)).fetchone()
+        return json.loads(fila[0]) if fila else defecto
+
+    def escribir(self, clave, valor):
+        self._ejecutar("INSERT OR REPLACE INTO docs VALUES (?, ?)", (clave, json.dumps(valor)))
+
+    @contextmanager
+    def transaccion(self):
+        """Lectura-modificación-escritura atómica entre procesos"""
+        with self._lock:
+            if self._en_transaccion:
+                yield self
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._en_transaccion = True
+            try:
+                yield self
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._en_transaccion = False
+
+
+def ruta_estado():
+    return os.getenv('FILAS_ESTADO_RUTA') or os.path.join(tempfile.gettempdir(), 'filas_estado.db')
+
+
+def crear_estado():
+    """Crear el almacén indicado por FILAS_ESTADO (memoria por defecto)"""
+    if os.getenv('FILAS_ESTADO', 'memoria') == 'sqlite':
+        return EstadoSQLite(ruta_estado())
+    return EstadoMemoria()
+
+
+def reiniciar_estado_compartido():
+    """Borrar el archivo SQLite de una ejecución anterior (antes de lanzar workers)"""
+    ruta = ruta_estado()
+    for sufijo in ('', '-wal', '-shm'):
+        try:
+            os.remove(ruta + sufijo)
+        except FileNotFoundError:
+            pass
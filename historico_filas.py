@@ -0,0 +1,270 @@
+"""Histórico de la fila en disco (append-only, un archivo binario por día)
+
+Cada día es historico/AAAA-MM-DD.bin con registros de 17 bytes (little-endian):
+
+    tipo      u1   LONGITUD (un minuto de fila de un segmento) o ATENCION
+    ts        u4   epoch en segundos (inicio del minuto para LONGITUD)
+    segmento  u2   0 = atención registrada a mano
+    n         u2   muestras del minuto (LONGITUD) / 1 (ATENCION)
+    valor     f4   suma de personas (LONGITUD) / espera en minutos (ATENCION)
+    maximo    f4   máximo de personas en el minuto (LONGITUD)
+
+Varios workers pueden escribir el mismo archivo: los registros se agregan en
+modo append y las consultas suman las muestras de un mismo minuto. Los
+resúmenes diarios van a resumenes.jsonl. Las consultas se sirven con rollups
+por día y resolución, que se cachean para los días ya cerrados; lo que todavía
+no está en disco (buffer y minutos abiertos) se suma desde una instantánea en
+memoria, sin forzar escrituras.
+"""
+import json
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+LONGITUD = 1
+ATENCION = 2
+
+FORMATO = '<BIHHff'
+TAMANO_REGISTRO = struct.calcsize(FORMATO)
+DTYPE = np.dtype([('tipo', 'u1'), ('ts', '<u4'), ('segmento', '<u2'), ('n', '<u2'),
+                  ('valor', '<f4'), ('maximo', '<f4')])
+
+# Resoluciones de consulta (todas dividen el día, así ningún bucket cruza medianoche)
+RESOLUCIONES = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': 86400}
+
+
+def _dia(ts):
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+
+
+def pico_por_minuto(registros):
+    """Mayor largo de fila total en un minuto, a partir de registros LONGITUD
+
+    Un mismo (minuto, segmento) puede tener varios registros (varios workers o
+    minutos parciales de un sincronizar forzado): primero el máximo por
+    segmento y después la suma entre segmentos.
+    """
+    minutos = registros[registros['tipo'] == LONGITUD]
+    if len(minutos) == 0:
+        return 0
+    claves = np.stack([minutos['ts'].astype(np.int64), minutos['segmento'].astype(np.int64)], axis=1)
+    unicas, grupo = np.unique(claves, axis=0, return_inverse=True)
+    maximo = np.zeros(len(unicas))
+    np.maximum.at(maximo, grupo.ravel(), minutos['maximo'])
+    _, minuto = np.unique(unicas[:, 0], return_inverse=True)
+    return int(np.bincount(minuto.ravel(), weights=maximo).max())
+
+
+class HistoricoFilas:
+    """Escritura append-only con fsync periódico y consultas por rango"""
+
+    def __init__(self, directorio, intervalo_fsync=30.0):
+        self.directorio = directorio
+        self.intervalo_fsync = intervalo_fsync
+        os.makedirs(directorio, exist_ok=True)
+
+        self._minutos = {}          # (minuto, segmento) -> [n, suma, maximo]
+        self._buffer = []           # registros empaquetados sin escribir
+        self._en_vuelo = {}         # dia -> (bytes en disco antes, registros) mientras se escriben
+        self._ultimo_fsync = time.time()
+        self._lock = threading.Lock()           # sincronizar() corre en un hilo
+        self._escritura_lock = threading.Lock()
+        self._cache = {}            # (dia, resolucion) -> rollup de un día cerrado
+        self._cache_lock = threading.Lock()     # las consultas corren en hilos
+
+    # ESCRITURA
+
+    def registrar_longitud(self, ts, segmento, personas):
+        """Acumular una muestra de largo de fila; se escribe al cerrar el minuto"""
+        minuto = int(ts) // 60 * 60
+        with self._lock:
+            acumulado = self._minutos.get((minuto, segmento))
+            if acumulado is None:
+                acumulado = self._minutos[(minuto, segmento)] = [0, 0.0, 0.0]
+            acumulado[0] += 1
+            acumulado[1] += personas
+            acumulado[2] = max(acumulado[2], personas)
+
+    def registrar_atencion(self, ts, segmento, espera_min):
+        registro = struct.pack(FORMATO, ATENCION, int(ts), segmento, 1, espera_min, 0.0)
+        with self._lock:
+            self._buffer.append(registro)
+
+    def cerrar_minutos(self, ahora=None):
+        """Pasar al buffer los minutos ya terminados"""
+        minuto_actual = int(time.time() if ahora is None else ahora) // 60 * 60
+        with self._lock:
+            for clave in [c for c in self._minutos if c[0] < minuto_actual]:
+                n, suma, maximo = self._minutos.pop(clave)
+                self._buffer.append(struct.pack(FORMATO, LONGITUD, clave[0], clave[1],
+                                                min(n, 0xFFFF), suma, maximo))
+
+    def sincronizar(self, forzar=False):
+        """Escribir el buffer al archivo del día; fsync cada intervalo_fsync
+
+        Pensado para correr en un hilo: el lock solo cubre tomar el buffer, no
+        la escritura, y hasta que termina instantanea() sigue contando esos
+        registros como pendientes.
+        """
+        if forzar:
+            self.cerrar_minutos(ahora=time.time() + 60)
+
+        with self._escritura_lock:
+            ahora = time.time()
+            with self._lock:
+                if not self._buffer or (not forzar and ahora - self._ultimo_fsync < self.intervalo_fsync):
+                    return
+
+                # Agrupar por día (un registro de antes de medianoche va al archivo de ese día)
+                por_dia = {}
+                for registro in self._buffer:
+                    por_dia.setdefault(_dia(struct.unpack_from('<I', registro, 1)[0]), []).append(registro)
+                self._buffer = []
+                self._en_vuelo = {dia: (self._tamano(dia), registros) for dia, registros in por_dia.items()}
+
+            try:
+                for dia, registros in por_dia.items():
+                    fd = os.open(self._ruta(dia), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    try:
+                        os.write(fd, b''.join(registros))
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+            finally:
+                with self._lock:
+                    self._en_vuelo = {}
+                self._ultimo_fsync = ahora
+
+    def guardar_resumen(self, resumen):
+        """Agregar el resumen de un día a resumenes.jsonl"""
+        with open(os.path.join(self.directorio, 'resumenes.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(resumen, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def instantanea(self):
+        """{dia: (bytes ya en disco, registros pendientes)} para consultar sin sincronizar
+
+        Lo pendiente y el largo del archivo se toman juntos bajo el lock: lo que
+        se está escribiendo cuenta como pendiente desde el largo previo a la
+        escritura, así nada se pierde ni se cuenta dos veces.
+        """
+        with self._lock:
+            abiertos = [struct.pack(FORMATO, LONGITUD, minuto, seg, min(n, 0xFFFF), suma, maximo)
+                        for (minuto, seg), (n, suma, maximo) in self._minutos.items()]
+            en_vuelo = [r for _, registros in self._en_vuelo.values() for r in registros]
+            pendientes = np.frombuffer(b''.join(en_vuelo + self._buffer + abiertos), dtype=DTYPE)
+            dias_pendientes = np.array([_dia(ts) for ts in pendientes['ts'].tolist()])
+
+            resultado = {}
+            for dia in set(dias_pendientes.tolist()) | set(self._en_vuelo) | {_dia(time.time())}:
+                en_disco = self._en_vuelo[dia][0] if dia in self._en_vuelo else self._tamano(dia)
+                resultado[dia] = (en_disco, pendientes[dias_pendientes == dia] if len(pendientes) else pendientes)
+        return resultado
+
+    # LECTURA
+
+    def _ruta(self, dia):
+        return os.path.join(self.directorio, f'{dia}.bin')
+
+    def _tamano(self, dia):
+        ruta = self._ruta(dia)
+        return os.path.getsize(ruta) if os.path.exists(ruta) else 0
+
+    def leer_dia(self, dia, limite=-1):
+        """Registros de un día como array estructurado (DTYPE), hasta limite bytes"""
+        ruta = self._ruta(dia)
+        if not os.path.exists(ruta):
+            return np.zeros(0, dtype=DTYPE)
+        datos = np.fromfile(ruta, dtype=np.uint8, count=limite)
+        # Un registro a medio escribir (corte de luz) se ignora
+        completos = len(datos) // TAMANO_REGISTRO * TAMANO_REGISTRO
+        return datos[:completos].view(DTYPE)
+
+    def _rollup_dia(self, dia, segundos, instantanea=None):
+        """{inicio: {'segmentos': {seg: [n, suma, maximo]}, 'atendidas', 'espera_suma'}}"""
+        clave = (dia, segundos)
+        pendiente = instantanea is not None and dia in instantanea
+        if not pendiente:
+            with self._cache_lock:
+                if clave in self._cache:
+                    return self._cache[clave]
+
+        if pendiente:
+            en_disco, pendientes = instantanea[dia]
+            registros = np.concatenate([self.leer_dia(dia, en_disco), pendientes])
+        else:
+            registros = self.leer_dia(dia)
+        medianoche = int(datetime.strptime(dia, '%Y-%m-%d').timestamp())
+        inicios = medianoche + (registros['ts'].astype(np.int64) - medianoche) // segundos * segundos
+        rollup = {}
+
+        longitud = registros['tipo'] == LONGITUD
+        if longitud.any():
+            # Agrupar por (bucket, segmento) sin bucles por registro
+            claves = np.stack([inicios[longitud], registros['segmento'][longitud]], axis=1)
+            unicas, grupo = np.unique(claves, axis=0, return_inverse=True)
+            grupo = grupo.ravel()
+            n = np.bincount(grupo, weights=registros['n'][longitud])
+            suma = np.bincount(grupo, weights=registros['valor'][longitud])
+            maximo = np.zeros(len(unicas))
+            np.maximum.at(maximo, grupo, registros['maximo'][longitud])
+            for (inicio, seg), ni, si, mi in zip(unicas.tolist(), n, suma, maximo):
+                bucket = rollup.setdefault(inicio, {'segmentos': {}, 'atendidas': 0, 'espera_suma': 0.0})
+                bucket['segmentos'][int(seg)] = [float(ni), float(si), float(mi)]
+
+        atencion = registros['tipo'] == ATENCION
+        if atencion.any():
+            unicas, grupo = np.unique(inicios[atencion], return_inverse=True)
+            conteo = np.bincount(grupo)
+            espera = np.bincount(grupo, weights=registros['valor'][atencion])
+            for inicio, c, e in zip(unicas.tolist(), conteo, espera):
+                bucket = rollup.setdefault(inicio, {'segmentos': {}, 'atendidas': 0, 'espera_suma': 0.0})
+                bucket['atendidas'] = int(c)
+                bucket['espera_suma'] = float(e)
+
+        # El día en curso sigue creciendo (y uno con pendientes aún no está completo en disco)
+        if dia < _dia(time.time()) and not pendiente:
+            with self._cache_lock:
+                self._cache[clave] = rollup
+        return rollup
+
+    def consultar(self, desde, hasta, resolucion='1h', instantanea=None):
+        """Serie agregada entre desde y hasta (epoch), sumando lo pendiente de instantanea()"""
+        segundos = RESOLUCIONES[resolucion]
+
+        serie = []
+        dia = datetime.fromtimestamp(desde).date()
+        while dia <= datetime.fromtimestamp(hasta).date():
+            for inicio, bucket in sorted(self._rollup_dia(dia.isoformat(), segundos, instantanea).items()):
+                if not desde <= inicio < hasta:
+                    continue
+                segmentos = {
+                    str(seg): {'promedio': round(suma / n, 2), 'maximo': maximo}
+                    for seg, (n, suma, maximo) in sorted(bucket['segmentos'].items())
+                }
+                serie.append({
+                    'inicio': inicio,
+                    'hora': datetime.fromtimestamp(inicio).strftime('%Y-%m-%d %H:%M'),
+                    'personas_promedio': round(sum(s['promedio'] for s in segmentos.values()), 2),
+                    'segmentos': segmentos,
+                    'atendidas': bucket['atendidas'],
+                    'espera_promedio': (round(bucket['espera_suma'] / bucket['atendidas'], 1)
+                                        if bucket['atendidas'] else None)
+                })
+            dia += timedelta(days=1)
+
+        return serie
+
+    def resumenes(self, desde, hasta):
+        """Resúmenes diarios guardados entre dos fechas (AAAA-MM-DD, inclusivo)"""
+        ruta = os.path.join(self.directorio, 'resumenes.jsonl')
+        if not os.path.exists(ruta):
+            return []
+        with open(ruta, encoding='utf-8') as f:
+            resumenes = [json.loads(linea) for linea in f if linea.strip()]
+        return [r for r in resumenes if desde <= r.get('fecha', '') <= hasta]
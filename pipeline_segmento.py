@@ -0,0 +1,938 @@
+"""Piezas del pipeline de detección por segmento: zona, filtrado y tracker"""
+import math
+import os
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# ORDEN DE LA FILA
+
+# Punto inicial (persona #1 / ventanilla)
+ORIGEN_FILA = (720, 700)
+
+# Dirección de la fila (diagonal hacia atrás)
+DIRECCION_FILA = (-1, -1)
+
+# Normalizar dirección
+norm = math.sqrt(DIRECCION_FILA[0]**2 + DIRECCION_FILA[1]**2)
+DIRECCION_FILA = (DIRECCION_FILA[0]/norm, DIRECCION_FILA[1]/norm)
+
+
+# ZONA DE FILA
+
+def parsear_zona_fila(texto):
+    """Convertir "x1,y1,x2,y2,..." (N vértices) en lista de puntos
+    
+    Sin texto devuelve el canvas completo.
+    """
+    if not texto:
+        return [
+            [0, 0],          
+            [1280, 0],
+            [1280, 720],
+            [0, 720]
+        ]
+    coords = [int(x) for x in texto.split(',')]
+    if len(coords) < 6 or len(coords) % 2 != 0:
+        raise ValueError('--zona-fila necesita al menos 3 puntos "x1,y1,x2,y2,x3,y3,..."')
+    return [[coords[i], coords[i + 1]] for i in range(0, len(coords), 2)]
+
+
+class ZonaFila:
+    """Zona de fila precompilada como máscara uint8 del tamaño del canvas"""
+    def __init__(self, puntos, ancho=1280, alto=720):
+        self.puntos = np.array(puntos, np.int32).reshape((-1, 1, 2))
+        self.ancho = ancho
+        self.alto = alto
+        
+        # Rasterizar una sola vez (soporta polígonos de N vértices)
+        self.mascara = np.zeros((alto, ancho), dtype=np.uint8)
+        cv2.fillPoly(self.mascara, [self.puntos], 1)
+    
+    def contiene(self, x, y):
+        """Lookup O(1) de un punto"""
+        x, y = int(x), int(y)
+        if x < 0 or y < 0 or x >= self.ancho or y >= self.alto:
+            return False
+        return bool(self.mascara[y, x])
+    
+    def contiene_lote(self, xs, ys):
+        """Lookup vectorizado de un lote de puntos"""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        dentro = (xs >= 0) & (ys >= 0) & (xs < self.ancho) & (ys < self.alto)
+        resultado = np.zeros(xs.shape, dtype=bool)
+        resultado[dentro] = self.mascara[ys[dentro], xs[dentro]] > 0
+        return resultado
+
+
+# PREPROCESAMIENTO
+
+def _letterbox(img, canvas, interpolacion=cv2.INTER_LINEAR):
+    """Redimensionar img una sola vez dentro de canvas (centrado) → (escala, x_offset, y_offset)"""
+    h, w = img.shape[:2]
+    target_h, target_w = canvas.shape[:2]
+    
+    scale = min(target_w / w, target_h / h)
+    new_w, new_h = int(w * scale), int(h * scale)
+    x_offset = (target_w - new_w) // 2
+    y_offset = (target_h - new_h) // 2
+    
+    destino = canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w]
+    if (new_w, new_h) == (w, h):
+        destino[:] = img
+    else:
+        cv2.resize(img, (new_w, new_h), dst=destino, interpolation=interpolacion)
+    
+    # El canvas se reutiliza: limpiar solo las bandas de padding (pueden tener dibujo previo)
+    canvas[:y_offset] = 0
+    canvas[y_offset+new_h:] = 0
+    canvas[:, :x_offset] = 0
+    canvas[:, x_offset+new_w:] = 0
+    
+    return scale, x_offset, y_offset
+
+
+def recortes_zona(zona, margen=40, mosaicos=1, alto_persona=300):
+    """Rectángulos canónicos (x1, y1, x2, y2) que cubren la zona para inferir solo ahí
+    
+    Es el rectángulo que encierra la zona más un margen, y alto_persona hacia
+    arriba porque las cajas se extienden desde los pies (que son los que caen
+    en la zona) y no hay que cortar cuerpos. Con mosaicos > 1 se parte a lo largo de su
+    lado mayor y cada parte se ajusta a la porción de zona que contiene, así
+    una fila diagonal larga no arrastra las esquinas vacías.
+    """
+    ys, xs = np.nonzero(zona.mascara)
+    if len(xs) == 0:
+        return [(0, 0, zona.ancho, zona.alto)]
+    
+    def ajustar(x1, y1, x2, y2):
+        return (max(0, int(x1) - margen), max(0, int(y1) - margen - alto_persona),
+                min(zona.ancho, int(x2) + margen + 1), min(zona.alto, int(y2) + margen + 1))
+    
+    x1, y1, x2, y2 = xs.min(), ys.min(), xs.max(), ys.max()
+    if mosaicos <= 1:
+        return [ajustar(x1, y1, x2, y2)]
+    
+    # Partes con solape de un margen para no cortar personas en la frontera
+    horizontal = (x2 - x1) >= (y2 - y1)
+    coord = xs if horizontal else ys
+    inicio, fin = (x1, x2) if horizontal else (y1, y2)
+    paso = (fin - inicio + 1) / mosaicos
+    
+    recortes = []
+    for i in range(mosaicos):
+        desde = inicio + i * paso - margen
+        hasta = inicio + (i + 1) * paso + margen
+        dentro = (coord >= desde) & (coord < hasta)
+        if dentro.any():
+            recortes.append(ajustar(xs[dentro].min(), ys[dentro].min(), xs[dentro].max(), ys[dentro].max()))
+    return recortes
+
+
+class Preprocesador:
+    """Letterbox directo a la entrada del modelo con canvas reutilizados
+    
+    entradas() hace un único resize del frame (o de cada recorte de la zona)
+    al tamaño de inferencia: lado mayor imgsz, múltiplo de 32, con el aspecto
+    del recorte, así YOLO no vuelve a redimensionar. detecciones() lleva las
+    cajas al espacio canónico 1280x720 en el que están definidas la zona,
+    ORIGEN_FILA y DIRECCION_FILA. canonico() genera la imagen 1280x720 solo
+    cuando hace falta dibujar o subir el frame.
+    """
+    
+    def __init__(self, imgsz=640, ancho=1280, alto=720, stride=32, recortes=None, iou=0.45):
+        self.ancho, self.alto = ancho, alto
+        self.recortes = list(recortes) if recortes else [(0, 0, ancho, alto)]
+        self.iou = iou
+        
+        # Todos los recortes comparten tamaño de entrada para ir en un mismo lote
+        recorte_w = max(x2 - x1 for x1, _, x2, _ in self.recortes)
+        recorte_h = max(y2 - y1 for _, y1, _, y2 in self.recortes)
+        escala = imgsz / max(recorte_w, recorte_h)
+        entrada_w = max(stride, int(math.ceil(recorte_w * escala / stride)) * stride)
+        entrada_h = max(stride, int(math.ceil(recorte_h * escala / stride)) * stride)
+        
+        self._entradas = [np.zeros((entrada_h, entrada_w, 3), dtype=np.uint8) for _ in self.recortes]
+        self._canonico = np.zeros((alto, ancho, 3), dtype=np.uint8)
+        
+        # Transformación entrada i → canónico: x_c = x * factor + (dx, dy)
+        self._transformaciones = [(1.0, 0.0, 0.0)] * len(self.recortes)
+    
+    @property
+    def tamano_entrada(self):
+        return self._entradas[0].shape[1], self._entradas[0].shape[0]
+    
+    def entradas(self, img):
+        """Frames listos para el modelo, uno por recorte (los buffers se reutilizan)"""
+        h, w = img.shape[:2]
+        escala_c = min(self.ancho / w, self.alto / h)
+        ox_c = (self.ancho - int(w * escala_c)) // 2
+        oy_c = (self.alto - int(h * escala_c)) // 2
+        
+        for i, (x1, y1, x2, y2) in enumerate(self.recortes):
+            # Recorte canónico → píxeles del frame (vista, sin copia)
+            fx1 = min(w - 1, max(0, int((x1 - ox_c) / escala_c)))
+            fy1 = min(h - 1, max(0, int((y1 - oy_c) / escala_c)))
+            fx2 = max(fx1 + 1, min(w, int(math.ceil((x2 - ox_c) / escala_c))))
+            fy2 = max(fy1 + 1, min(h, int(math.ceil((y2 - oy_c) / escala_c))))
+            
+            escala_m, ox_m, oy_m = _letterbox(img[fy1:fy2, fx1:fx2], self._entradas[i])
+            factor = escala_c / escala_m
+            self._transformaciones[i] = (factor,
+                                         (fx1 - ox_m / escala_m) * escala_c + ox_c,
+                                         (fy1 - oy_m / escala_m) * escala_c + oy_c)
+        
+        return self._entradas
+    
+    def a_canonico(self, xyxy, indice=0):
+        """Cajas xyxy de la entrada indice → coordenadas canónicas 1280x720"""
+        factor, dx, dy = self._transformaciones[indice]
+        cajas = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4) * factor
+        cajas[:, 0::2] += dx
+        cajas[:, 1::2] += dy
+        return cajas
+    
+    def detecciones(self, resultados):
+        """(xyxy canónico, conf, cls) de los resultados YOLO de todos los recortes
+        
+        Con varios recortes, las personas repetidas en el solape se eliminan con NMS.
+        """
+        xyxy, conf, cls = [], [], []
+        for i, r in enumerate(resultados):
+            boxes = r.boxes.cpu().numpy()
+            xyxy.append(self.a_canonico(boxes.xyxy, i))
+            conf.append(np.asarray(boxes.conf, dtype=np.float64).ravel())
+            cls.append(np.asarray(boxes.cls).ravel())
+        
+        xyxy = np.concatenate(xyxy) if xyxy else np.zeros((0, 4))
+        conf = np.concatenate(conf) if conf else np.zeros(0)
+        cls = np.concatenate(cls) if cls else np.zeros(0)
+        
+        if len(self.recortes) > 1 and len(xyxy) > 1:
+            cajas_xywh = np.column_stack([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]]).tolist()
+            conservar = np.asarray(cv2.dnn.NMSBoxes(cajas_xywh, conf.tolist(), 0.0, self.iou), dtype=np.int64).ravel()
+            conservar.sort()
+            xyxy, conf, cls = xyxy[conservar], conf[conservar], cls[conservar]
+        
+        return xyxy, conf, cls
+    
+    def canonico(self, img):
+        """Imagen 1280x720 (aspect ratio con padding) sobre un canvas reutilizado"""
+        _letterbox(img, self._canonico)
+        return self._canonico
+
+
+def crear_preprocesador(args, zona):
+    """Preprocesador según --imgsz y --roi/--roi-margen/--roi-mosaicos/--roi-alto-persona"""
+    recortes = (recortes_zona(zona, args.roi_margen, args.roi_mosaicos, args.roi_alto_persona)
+                if args.roi else None)
+    return Preprocesador(args.imgsz, recortes=recortes)
+
+
+# FILTRADO DE DETECCIONES
+
+def filtrar_detecciones(xyxy, conf, cls, umbral, zona, clases_objetivo=(0,),
+                        area_minima=400, aspect_min=0.8, aspect_max=5.0):
+    """Filtrar las cajas YOLO de un frame en una sola pasada vectorizada
+    
+    Devuelve (centros, bboxes, confianzas, detecciones_brutas)
+    """
+    cls = np.asarray(cls).astype(np.int64).ravel()
+    es_objetivo = np.isin(cls, np.asarray(clases_objetivo, dtype=np.int64))
+    detecciones_brutas = int(es_objetivo.sum())
+    
+    if detecciones_brutas == 0:
+        return [], [], [], 0
+    
+    cajas = np.asarray(xyxy)[es_objetivo].astype(np.int64)
+    conf = np.asarray(conf, dtype=np.float64).ravel()[es_objetivo]
+    x1, y1, x2, y2 = cajas.T
+    
+    # FILTRO 1: Confianza
+    mascara = conf > umbral
+    
+    # FILTRO 2: Dimensiones del bbox 
+    ancho = x2 - x1
+    alto = y2 - y1
+    area = ancho * alto
+    aspect_ratio = np.divide(alto, ancho, out=np.zeros(len(cajas)), where=ancho > 0)
+    
+    mascara &= area >= area_minima
+    
+    # Ancho/Alto mínimos individuales 
+    mascara &= (ancho >= 30) & (alto >= 40)
+    
+    # Proporción humana AMPLIA 
+    mascara &= (aspect_ratio >= aspect_min) & (aspect_ratio <= aspect_max)
+    
+    # Tamaño máximo MÁS PERMISIVO 
+    mascara &= (ancho <= 600) & (alto <= 900)
+    
+    # FILTRO 3: Proximidad a la zona (punto inferior del bbox)
+    cx = (x1 + x2) // 2
+    cy = y2
+    mascara[mascara] = zona.contiene_lote(cx[mascara], cy[mascara])
+    
+    centros = list(zip(cx[mascara].tolist(), cy[mascara].tolist()))
+    bboxes = [tuple(b) for b in cajas[mascara].tolist()]
+    confianzas = conf[mascara].tolist()
+    
+    return centros, bboxes, confianzas, detecciones_brutas
+
+
+# TRACKER
+
+class TrackerSegmento:
+    """Tracker avanzado con predicción de movimiento
+    
+    Los tracks viven en una tabla de arrays NumPy preasignados (un slot por
+    track, con máscara de activos y reutilización de slots). objects,
+    velocidades, bboxes, etc. son vistas dict de solo lectura de esa tabla.
+    """
+    def __init__(self, distancia_fusion=80, distancia_max=100, max_disappeared=45, matching='hungaro',
+                 origen_fila=ORIGEN_FILA, direccion_fila=DIRECCION_FILA, capacidad=64):
+        self.distancia_fusion = distancia_fusion
+        self.distancia_max = distancia_max
+        self.max_disappeared = max_disappeared
+        self.matching = matching
+        self.origen_fila = origen_fila
+        self.direccion_fila = direccion_fila
+        
+        self.next_id = 0
+        
+        # Tabla de tracks (struct-of-arrays)
+        self._ids = np.full(capacidad, -1, dtype=np.int64)          # slot -> id
+        self._activo = np.zeros(capacidad, dtype=bool)
+        self._centros = np.zeros((capacidad, 2), dtype=np.float64)  # centro
+        self._velocidades = np.zeros((capacidad, 2), dtype=np.float64)  # (vx, vy)
+        self._bboxes = np.zeros((capacidad, 4), dtype=np.int64)
+        self._tiene_bbox = np.zeros(capacidad, dtype=bool)
+        self._disappeared = np.zeros(capacidad, dtype=np.int64)     # frames sin detectar
+        self._sin_medir = np.zeros(capacidad, dtype=np.int64)       # frames solo predichos desde la última detección
+        self._tiempo_entrada = np.zeros(capacidad, dtype=np.float64)
+        self._last_update = np.zeros(capacidad, dtype=np.float64)
+        self._confianzas = np.zeros(capacidad, dtype=np.float64)    # confianza promedio
+        
+        self._slots = {}            # id -> slot
+        self._libres = list(range(capacidad - 1, -1, -1))
+        
+        self._version = 0
+        self._vistas = {}
+    
+    # VISTAS (compatibilidad con el código de dibujo)
+    
+    def _slots_activos(self):
+        """Slots activos ordenados por id (orden de registro)"""
+        slots = np.flatnonzero(self._activo)
+        return slots[np.argsort(self._ids[slots], kind='stable')]
+    
+    def _vista(self, nombre):
+        cache = self._vistas.get(nombre)
+        if cache is not None and cache[0] == self._version:
+            return cache[1]
+        
+        slots = self._slots_activos()
+        ids = self._ids[slots].tolist()
+        if nombre == 'objects':
+            valores = [tuple(c) for c in self._centros[slots].astype(np.int64).tolist()]
+        elif nombre == 'velocidades':
+            valores = [tuple(v) for v in self._velocidades[slots].tolist()]
+        elif nombre == 'bboxes':
+            con_bbox = self._tiene_bbox[slots]
+            ids = [oid for oid, tiene in zip(ids, con_bbox.tolist()) if tiene]
+            valores = [tuple(b) for b in self._bboxes[slots[con_bbox]].tolist()]
+        elif nombre == 'disappeared':
+            valores = self._disappeared[slots].tolist()
+        elif nombre == 'tiempo_entrada':
+            valores = self._tiempo_entrada[slots].tolist()
+        elif nombre == 'last_update':
+            valores = self._last_update[slots].tolist()
+        else:
+            valores = self._confianzas[slots].tolist()
+        
+        vista = dict(zip(ids, valores))
+        self._vistas[nombre] = (self._version, vista)
+        return vista
+    
+    @property
+    def objects(self):
+        """id -> centro"""
+        return self._vista('objects')
+    
+    @property
+    def velocidades(self):
+        """id -> (vx, vy)"""
+        return self._vista('velocidades')
+    
+    @property
+    def bboxes(self):
+        """id -> bbox"""
+        return self._vista('bboxes')
+    
+    @property
+    def disappeared(self):
+        """id -> frames sin detectar"""
+        return self._vista('disappeared')
+    
+    @property
+    def tiempo_entrada(self):
+        """id -> timestamp"""
+        return self._vista('tiempo_entrada')
+    
+    @property
+    def last_update(self):
+        """id -> timestamp"""
+        return self._vista('last_update')
+    
+    @property
+    def confianzas(self):
+        """id -> confianza promedio"""
+        return self._vista('confianzas')
+    
+    def _fusionar_detecciones(self, detecciones, bboxes, confianzas):
+        """Fusionar detecciones cercanas (madre-bebé)
+        
+        Agrupa por radio usando una grilla de celdas de lado distancia_fusion:
+        cada detección solo se compara con las de su celda y las 8 vecinas.
+        """
+        if len(detecciones) <= 1:
+            return detecciones, bboxes, confianzas
+        
+        radio = self.distancia_fusion
+        radio2 = radio * radio
+        
+        # Indexar detecciones por celda (en orden de llegada)
+        celdas = {}
+        posiciones = []
+        for i, (x, y) in enumerate(detecciones):
+            celda = (int(x // radio), int(y // radio)) if radio > 0 else (0, 0)
+            celdas.setdefault(celda, []).append(i)
+            posiciones.append(celda)
+        
+        fusionadas = []
+        bboxes_f = []
+        confs_f = []
+        usadas = [False] * len(detecciones)
+        
+        for i, c1 in enumerate(detecciones):
+            if usadas[i]:
+                continue
+            usadas[i] = True
+            
+            grupo = [i]
+            cx, cy = posiciones[i]
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for j in celdas.get((cx + dx, cy + dy), ()):
+                        if usadas[j]:
+                            continue
+                        ddx = c1[0] - detecciones[j][0]
+                        ddy = c1[1] - detecciones[j][1]
+                        if ddx * ddx + ddy * ddy < radio2:
+                            grupo.append(j)
+                            usadas[j] = True
+            
+            # Usar bbox con mayor confianza (empate: menor índice, como antes)
+            if len(grupo) > 1:
+                idx = max(grupo, key=lambda k: (confianzas[k], -k))
+                bbox_f = bboxes[idx]
+                centro_f = (int((bbox_f[0]+bbox_f[2])/2), int(bbox_f[3]))
+                conf_f = confianzas[idx]
+            else:
+                centro_f = detecciones[i]
+                bbox_f = bboxes[i]
+                conf_f = confianzas[i]
+            
+            fusionadas.append(centro_f)
+            bboxes_f.append(bbox_f)
+            confs_f.append(conf_f)
+        
+        return fusionadas, bboxes_f, confs_f
+    
+    def _predecir_posicion(self, oid):
+        """Predecir posicion basada en velocidad"""
+        slot = self._slots[oid]
+        x, y = self._predecir_slots(np.array([slot]))[0]
+        return (int(x), int(y))
+    
+    def _predecir_slots(self, slots):
+        """Predicción simple (posición + velocidad) para varios slots a la vez"""
+        return np.trunc(self._centros[slots] + self._velocidades[slots])
+    
+    def actualizar(self, detecciones, bboxes=None, confianzas=None):
+        if bboxes is None:
+            bboxes = [None] * len(detecciones)
+        if confianzas is None:
+            confianzas = [1.0] * len(detecciones)
+        
+        # Fusionar detecciones cercanas
+        if len(detecciones) > 0 and bboxes[0] is not None:
+            detecciones, bboxes, confianzas = self._fusionar_detecciones(
+                detecciones, bboxes, confianzas
+            )
+        
+        slots = self._slots_activos()
+        
+        # Sin detecciones: incrementar disappeared
+        if len(detecciones) == 0:
+            self._envejecer(slots)
+            return self.objects
+        
+        # Sin objetos previos: registrar todos
+        if len(slots) == 0:
+            for c, b, conf in zip(detecciones, bboxes, confianzas):
+                self._registrar(c, b, conf)
+            return self.objects
+        
+        #  MATCHING CON PREDICCIÓN
+        obj_ids = self._ids[slots].tolist()
+        
+        # Matriz de costos en una sola operación (posiciones predichas vs detecciones)
+        predichas = self._predecir_slots(slots)
+        centros = np.array(detecciones, dtype=np.float64)
+        costos = np.linalg.norm(predichas[:, None, :] - centros[None, :, :], axis=2)
+        
+        if self.matching == 'greedy':
+            asignaciones = self._asignar_greedy(costos, obj_ids)
+        else:
+            asignaciones = self._asignar_hungaro(costos, obj_ids)
+        usadas = set(asignaciones.values())
+        
+        if asignaciones:
+            filas = np.array([self._slots[oid] for oid in asignaciones], dtype=np.int64)
+            columnas = np.array(list(asignaciones.values()), dtype=np.int64)
+            
+            # Velocidad suavizada (por frame: si hubo frames solo predichos, el error
+            # de la predicción se reparte entre ellos)
+            pos_nueva = centros[columnas]
+            pasos = (self._sin_medir[filas] + 1)[:, None]
+            v = self._velocidades[filas] + (pos_nueva - self._centros[filas] - self._velocidades[filas]) / pasos
+            self._velocidades[filas] = 0.7 * v + 0.3 * self._velocidades[filas]
+            
+            self._centros[filas] = pos_nueva
+            self._disappeared[filas] = 0
+            self._sin_medir[filas] = 0
+            self._last_update[filas] = time.time()
+            
+            # Actualizar confianza 
+            confs = np.asarray(confianzas, dtype=np.float64)[columnas]
+            self._confianzas[filas] = 0.8 * self._confianzas[filas] + 0.2 * confs
+            
+            con_bbox = [k for k, j in enumerate(columnas.tolist()) if bboxes[j]]
+            if con_bbox:
+                self._bboxes[filas[con_bbox]] = [bboxes[j] for j in columnas[con_bbox].tolist()]
+                self._tiene_bbox[filas[con_bbox]] = True
+        
+        # Incrementar disappeared para no asignados
+        no_asignados = np.ones(len(slots), dtype=bool)
+        if asignaciones:
+            no_asignados[np.isin(slots, filas)] = False
+        self._envejecer(slots[no_asignados])
+        
+        # Registrar nuevas detecciones
+        for j, (c, b, conf) in enumerate(zip(detecciones, bboxes, confianzas)):
+            if j not in usadas:
+                self._registrar(c, b, conf)
+        
+        self._version += 1
+        return self.objects
+    
+    def velocidades_vistas(self):
+        """Velocidades (px/frame) de los tracks detectados en la última actualización"""
+        slots = np.flatnonzero(self._activo)
+        return self._velocidades[slots[self._disappeared[slots] == 0]]
+    
+    def predecir(self):
+        """Avanzar un frame sin detección: los tracks vistos se mueven según su velocidad
+        
+        No cuenta como frame perdido (no hubo detección que pudiera fallar).
+        """
+        slots = self._slots_activos()
+        slots = slots[self._disappeared[slots] == 0]
+        if len(slots) == 0:
+            return self.objects
+        
+        desplazamiento = self._velocidades[slots]
+        self._centros[slots] += desplazamiento
+        self._bboxes[slots] += np.rint(np.tile(desplazamiento, 2)).astype(np.int64)
+        self._sin_medir[slots] += 1
+        self._version += 1
+        return self.objects
+    
+    def _envejecer(self, slots):
+        """Incrementar disappeared de un grupo de slots y podar los vencidos"""
+        self._disappeared[slots] += 1
+        vencidos = slots[self._disappeared[slots] > self.max_disappeared]
+        for oid in self._ids[vencidos].tolist():
+            self._eliminar(oid)
+        self._version += 1
+    
+    def _asignar_hungaro(self, costos, obj_ids):
+        """Asignación óptima (linear sum assignment) con gating por distancia"""
+        fuera = costos > self.distancia_max
+        # Penalización finita: el solver no acepta inf
+        costos_gated = np.where(fuera, self.distancia_max * 1000.0 + 1.0, costos)
+        filas, columnas = linear_sum_assignment(costos_gated)
+        
+        return {
+            obj_ids[i]: j
+            for i, j in zip(filas.tolist(), columnas.tolist())
+            if not fuera[i, j]
+        }
+    
+    def _asignar_greedy(self, costos, obj_ids):
+        """Asignación greedy por menor distancia (modo de comparación)"""
+        costos = np.where(costos > self.distancia_max, np.inf, costos)
+        asignaciones = {}
+        
+        while not np.all(np.isinf(costos)):
+            i, j = np.unravel_index(np.argmin(costos), costos.shape)
+            asignaciones[obj_ids[i]] = int(j)
+            costos[i, :] = np.inf
+            costos[:, j] = np.inf
+        
+        return asignaciones
+    
+    def _registrar(self, centro, bbox, confianza=1.0):
+        if not self._libres:
+            self._crecer()
+        slot = self._libres.pop()
+        ahora = time.time()
+        
+        self._ids[slot] = self.next_id
+        self._activo[slot] = True
+        self._centros[slot] = centro
+        self._velocidades[slot] = (0, 0)
+        self._disappeared[slot] = 0
+        self._sin_medir[slot] = 0
+        self._tiempo_entrada[slot] = ahora
+        self._last_update[slot] = ahora
+        self._confianzas[slot] = confianza
+        self._tiene_bbox[slot] = bool(bbox)
+        if bbox:
+            self._bboxes[slot] = bbox
+        self._slots[self.next_id] = slot
+        self._version += 1
+        
+        print(f"[tracker] ✓ Registrar ID={self.next_id} conf={confianza:.2f}")
+        self.next_id += 1
+    
+    def _eliminar(self, oid):
+        print(f"[tracker] ✗ Eliminar ID={oid}")
+        slot = self._slots.pop(oid, None)
+        if slot is None:
+            return
+        self._activo[slot] = False
+        self._ids[slot] = -1
+        self._libres.append(slot)
+        self._version += 1
+    
+    def _crecer(self):
+        """Duplicar la capacidad de la tabla de tracks"""
+        capacidad = len(self._ids)
+        nueva = capacidad * 2
+        for nombre in ['_ids', '_activo', '_centros', '_velocidades', '_bboxes', '_tiene_bbox',
+                       '_disappeared', '_sin_medir', '_tiempo_entrada', '_last_update', '_confianzas']:
+            actual = getattr(self, nombre)
+            relleno = -1 if nombre == '_ids' else 0
+            ampliado = np.full((nueva,) + actual.shape[1:], relleno, dtype=actual.dtype)
+            ampliado[:capacidad] = actual
+            setattr(self, nombre, ampliado)
+        self._libres = list(range(nueva - 1, capacidad - 1, -1)) + self._libres
+    
+    def obtener_personas_ordenadas(self, zona):
+   
+        slots = self._slots_activos()
+        centros = self._centros[slots].astype(np.int64)
+        en_zona = zona.contiene_lote(centros[:, 0], centros[:, 1])
+        slots, centros = slots[en_zona], centros[en_zona]
+
+        # Proyección escalar (desde el origen) sobre la dirección de la fila
+        proyecciones = ((centros[:, 0] - self.origen_fila[0]) * self.direccion_fila[0]
+                        + (centros[:, 1] - self.origen_fila[1]) * self.direccion_fila[1])
+
+        #ORDEN REAL DE FILA
+        orden = np.argsort(proyecciones, kind='stable')
+
+        personas = []
+        for k in orden.tolist():
+            slot = slots[k]
+            centro = (int(centros[k, 0]), int(centros[k, 1]))
+            personas.append({
+                'local_id': int(self._ids[slot]),
+                'centro': centro,
+                'centro_x': centro[0],
+                'centro_y': centro[1],
+                'proyeccion': float(proyecciones[k]),
+                'bbox': tuple(self._bboxes[slot].tolist()) if self._tiene_bbox[slot] else None,
+                'confianza': float(self._confianzas[slot])
+            })
+
+        return personas
+
+
+# COMPUERTA DE MOVIMIENTO
+
+class DetectorMovimiento:
+    """Compuerta barata antes de YOLO: diferencia de frames reducidos dentro de la zona
+    
+    Compara el frame (160x90, gris, suavizado) contra el de la última vez que
+    hubo movimiento, así los cambios lentos se acumulan hasta disparar. Con
+    menos de `sensibilidad` (fracción de píxeles de la zona que cambiaron) se
+    puede saltear la inferencia; cada `intervalo_max` segundos se fuerza una
+    para reconfirmar a las personas quietas.
+    """
+    
+    def __init__(self, zona, sensibilidad=0.01, intervalo_max=10.0, umbral_pixel=25, ancho=160, alto=90):
+        self.sensibilidad = sensibilidad
+        self.intervalo_max = intervalo_max
+        self.umbral_pixel = umbral_pixel
+        
+        self.mascara = cv2.resize(zona.mascara, (ancho, alto), interpolation=cv2.INTER_NEAREST) > 0
+        self._area = max(1, int(self.mascara.sum()))
+        self._canvas = np.zeros((alto, ancho, 3), dtype=np.uint8)
+        self._referencia = None
+        self._ultima = 0.0
+        
+        self.cambio = 0.0       # fracción de la zona que cambió en el último frame
+        self.salteados = 0
+    
+    def _reducir(self, img):
+        _letterbox(img, self._canvas, interpolacion=cv2.INTER_AREA)
+        gris = cv2.cvtColor(self._canvas, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gris, (5, 5), 0)
+    
+    def hay_movimiento(self, img, ahora=None):
+        """True si hay que inferir (movimiento en la zona o venció intervalo_max)"""
+        ahora = time.time() if ahora is None else ahora
+        actual = self._reducir(img)
+        
+        if self._referencia is None or ahora - self._ultima >= self.intervalo_max:
+            self.cambio = 1.0
+        else:
+            diferencia = cv2.absdiff(actual, self._referencia)
+            self.cambio = np.count_nonzero((diferencia > self.umbral_pixel) & self.mascara) / self._area
+        
+        if self.cambio < self.sensibilidad:
+            self.salteados += 1
+            return False
+        
+        self._referencia = actual
+        self._ultima = ahora
+        return True
+
+
+def crear_detector_movimiento(args, zona):
+    """DetectorMovimiento según --movimiento (None si está desactivado)"""
+    if not args.movimiento:
+        return None
+    return DetectorMovimiento(zona, args.movimiento_sensibilidad, args.movimiento_intervalo_max)
+
+
+# PLANIFICACIÓN DE DETECCIONES
+
+class PlanificadorDeteccion:
+    """Decide en qué frames correr YOLO: cada K frames, con K adaptativo
+    
+    K crece de a uno (hasta k_max) mientras los tracks se mueven poco y la
+    cantidad de detecciones es estable; vuelve a 1 apenas alguien se mueve
+    más de desplazamiento_max px entre detecciones o cambia el conteo. El
+    conteo se mira por la mediana de las últimas detecciones, así un parpadeo
+    de YOLO (±1 en un frame) no reinicia K. En los frames salteados el
+    tracker solo predice (TrackerSegmento.predecir).
+    """
+    
+    def __init__(self, k_max=1, desplazamiento_max=15.0, ventana=5):
+        self.k_max = max(1, k_max)
+        self.desplazamiento_max = desplazamiento_max
+        self.k = 1
+        self._conteos = deque(maxlen=ventana)
+        self._mediana = None    # conteo estable de referencia
+        self._frames = 0
+        
+        self.detectados = 0
+        self.salteados = 0
+    
+    def detectar_ahora(self):
+        """Llamar una vez por frame"""
+        self._frames += 1
+        if self._frames >= self.k:
+            self._frames = 0
+            self.detectados += 1
+            return True
+        self.salteados += 1
+        return False
+    
+    def registrar(self, velocidades, detecciones):
+        """Ajustar K con las velocidades (px/frame) de los tracks vistos y el conteo de detecciones"""
+        self._conteos.append(detecciones)
+        if self.k_max == 1:
+            return
+        
+        # Cambio sostenido del conteo: se movió la mediana de la ventana
+        mediana = float(np.median(self._conteos))
+        if self._mediana is None or abs(mediana - self._mediana) >= 0.5:
+            cambio = self._mediana is not None
+            self._mediana = mediana
+            if cambio:
+                self.k = 1
+                return
+        
+        velocidad = max((math.hypot(vx, vy) for vx, vy in velocidades), default=0.0)
+        k = int(self.desplazamiento_max / velocidad) if velocidad > 0 else self.k_max
+        self.k = max(1, min(k, self.k + 1, self.k_max))
+
+
+# MODELO
+
+# Backends de inferencia: PyTorch o el modelo exportado una vez a ONNX Runtime / OpenVINO (CPU)
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+
+def exportar_modelo(ruta, backend, imgsz=640, int8=False):
+    """Exportar los pesos .pt al backend una sola vez (si ya existe se reutiliza)
+    
+    onnx: ONNX dinámico (lote e imgsz variables) para ONNX Runtime; int8 aplica
+    cuantización dinámica de pesos con onnxruntime.quantization.
+    openvino: IR de OpenVINO; int8 usa la cuantización de Ultralytics (NNCF).
+    """
+    from ultralytics import YOLO
+    
+    base = os.path.splitext(ruta)[0]
+    
+    if backend == 'onnx':
+        destino = f"{base}{'_int8' if int8 else ''}.onnx"
+        if os.path.exists(destino):
+            return destino
+        exportado = f"{base}.onnx"
+        if not os.path.exists(exportado):
+            print(f"Exportando {ruta} a ONNX...")
+            exportado = YOLO(ruta).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            print("Cuantizando a INT8...")
+            quantize_dynamic(exportado, destino, weight_type=QuantType.QUInt8)
+        return destino
+    
+    if backend == 'openvino':
+        destino = f"{base}{'_int8' if int8 else ''}_openvino_model"
+        if os.path.isdir(destino):
+            return destino
+        print(f"Exportando {ruta} a OpenVINO{' INT8' if int8 else ''}...")
+        return YOLO(ruta).export(format='openvino', imgsz=imgsz, dynamic=True, int8=int8)
+    
+    raise ValueError(f"Backend desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
+
+
+def cargar_modelo(ruta='yolov8s.pt', backend='torch', int8=False, imgsz=640):
+    """Cargar YOLO con las optimizaciones y overrides para detectar personas"""
+    from ultralytics import YOLO
+    
+    if backend == 'torch':
+        import torch
+        
+        print(f"Cargando modelo {ruta}...")
+        model = YOLO(ruta)
+        
+        # OPTIMIZACIONES DEL MODELO
+        if torch.cuda.is_available():
+            model.to('cuda')
+        else:
+            print("Modelo en CPU")
+        
+        # Fusionar capas para mayor velocidad
+        model.fuse()
+    else:
+        # El modelo exportado ya viene fusionado y corre en CPU
+        ruta = exportar_modelo(ruta, backend, imgsz=imgsz, int8=int8)
+        print(f"Cargando modelo {ruta} ({backend})...")
+        model = YOLO(ruta, task='detect')
+    
+    # Configurar para detección optimizada de personas
+    model.overrides['conf'] = 0.25      # Umbral bajo inicial
+    model.overrides['iou'] = 0.45       # NMS threshold
+    model.overrides['classes'] = [0]    # Solo clase 
+    model.overrides['max_det'] = 50     # Máximo 50 personas por frame
+    model.overrides['imgsz'] = imgsz
+    
+    print("✓ Modelo optimizado")
+    return model
+
+
+def ids_clase(model, objetivo="person"):
+    """Ids de clase del modelo que corresponden al objetivo"""
+    try:
+        raw_names = model.names
+        classNames = raw_names if isinstance(raw_names, dict) else {i: n for i, n in enumerate(raw_names)}
+    except:
+        classNames = {0: 'person'}
+    return [i for i, n in classNames.items() if n == objetivo]
+
+
+# ARGUMENTOS COMPARTIDOS
+
+def agregar_argumentos_pipeline(parser):
+    """Argumentos CLI comunes a los detectores (filtros, tracker, headless, backend)"""
+    parser.add_argument('--umbral-confianza', type=float, default=0.20,
+                        help='Umbral de confianza YOLO')
+    
+    parser.add_argument('--distancia-fusion', type=int, default=80,
+                        help='Distancia para fusionar detecciones')
+    
+    parser.add_argument('--distancia-max', type=int, default=150,
+                        help='Distancia máxima para matching')
+    
+    parser.add_argument('--matching', type=str, default='hungaro', choices=['hungaro', 'greedy'],
+                        help='Algoritmo de asignación detección-track')
+    
+    parser.add_argument('--max-disappeared', type=int, default=60,
+                        help='Frames sin detección antes de eliminar')
+    
+    parser.add_argument('--area-minima', type=int, default=400,
+                        help='Área mínima del bbox (px²) - reducido para personas parciales')
+    
+    parser.add_argument('--aspect-min', type=float, default=0.8,
+                        help='Aspect ratio mínimo (alto/ancho) - permite personas cortadas')
+    
+    parser.add_argument('--aspect-max', type=float, default=5.0,
+                        help='Aspect ratio máximo (alto/ancho) - más permisivo')
+    
+    parser.add_argument('--headless', action='store_true',
+                        help='Sin ventana ni dibujo (servidores sin display)')
+    
+    parser.add_argument('--backend', type=str, default='torch', choices=BACKENDS,
+                        help='Runtime de inferencia (onnx/openvino exportan el modelo la primera vez)')
+    
+    parser.add_argument('--int8', action='store_true',
+                        help='Cuantizar el modelo exportado a INT8 (solo onnx/openvino)')
+    
+    parser.add_argument('--imgsz', type=int, default=640,
+                        help='Resolución de inferencia (lado mayor, múltiplo de 32)')
+    
+    parser.add_argument('--roi', action='store_true',
+                        help='Inferir solo sobre el rectángulo que encierra la zona de fila')
+    
+    parser.add_argument('--roi-margen', type=int, default=40,
+                        help='Margen del recorte ROI alrededor de la zona (px canónicos)')
+    
+    parser.add_argument('--roi-mosaicos', type=int, default=1,
+                        help='Partir el ROI en N recortes procesados en lote (filas diagonales largas)')
+    
+    parser.add_argument('--roi-alto-persona', type=int, default=300,
+                        help='Alto de una persona en px canónicos: el ROI se extiende esto por encima de la zona')
+    
+    parser.add_argument('--salto-max', type=int, default=1,
+                        help='Correr YOLO como mucho cada N frames cuando la fila está quieta (1 = todos)')
+    
+    parser.add_argument('--movimiento', action='store_true',
+                        help='Saltear YOLO mientras no haya movimiento en la zona de fila')
+    
+    parser.add_argument('--movimiento-sensibilidad', type=float, default=0.01,
+                        help='Fracción de la zona que debe cambiar para inferir (menor = más sensible)')
+    
+    parser.add_argument('--movimiento-intervalo-max', type=float, default=10.0,
+                        help='Segundos máximos sin inferir aunque la escena esté quieta')
@@ -0,0 +1,145 @@
+"""Pronóstico de la fila a partir de llegadas y atenciones observadas
+
+Aprende en línea (promedios exponenciales) el tiempo entre atenciones y el
+tiempo entre llegadas. Con eso estima la espera p50/p90 de cada posición
+(suma de servicios con aproximación normal) y cuántos minutos faltan para
+que las ventanillas abiertas no alcancen a atender a todos antes del cierre.
+
+Mientras no hay suficientes observaciones se usa el tiempo de atención
+configurado. El estado se serializa a dict para el almacén compartido.
+"""
+import math
+
+Z_P90 = 1.2816
+
+# Intervalos más largos que esto (pausas, fila vacía) no describen el ritmo
+MAX_INTERVALO_MIN = 30.0
+
+
+class PromedioExponencial:
+    """Media y varianza con olvido exponencial"""
+
+    def __init__(self, alfa, media=0.0, varianza=0.0, n=0):
+        self.alfa = alfa
+        self.media = media
+        self.varianza = varianza
+        self.n = n
+
+    def agregar(self, x):
+        if self.n == 0:
+            self.media = x
+        else:
+            diff = x - self.media
+            incremento = self.alfa * diff
+            self.media += incremento
+            self.varianza = (1 - self.alfa) * (self.varianza + diff * incremento)
+        self.n += 1
+
+    def a_dict(self):
+        return {'media': self.media, 'varianza': self.varianza, 'n': self.n}
+
+    @classmethod
+    def desde_dict(cls, alfa, d):
+        return cls(alfa, d['media'], d['varianza'], d['n'])
+
+
+class PronosticoFila:
+    """Tasas de llegada y de atención aprendidas en línea"""
+
+    def __init__(self, alfa=0.1, min_observaciones=5):
+        self.alfa = alfa
+        self.min_observaciones = min_observaciones
+        self.servicio = PromedioExponencial(alfa)   # minutos entre atenciones
+        self.llegadas = PromedioExponencial(alfa)   # minutos entre llegadas
+        self.ultima_atencion = None
+        self.espera_tras_atencion = False   # quedaba gente en la fila tras la última atención
+        self.ultima_llegada = None
+
+    # OBSERVACIONES
+
+    def registrar_atencion(self, ts, en_espera):
+        """Atención en ts; en_espera = personas que siguen en la fila después de ella
+
+        Solo si quedaba gente tras la atención anterior el intervalo es tiempo
+        de servicio; con la fila vacía incluye el tiempo ocioso hasta la
+        siguiente llegada.
+        """
+        if self.ultima_atencion is not None and self.espera_tras_atencion:
+            intervalo = (ts - self.ultima_atencion) / 60
+            if 0 < intervalo <= MAX_INTERVALO_MIN:
+                self.servicio.agregar(intervalo)
+        self.ultima_atencion = ts
+        self.espera_tras_atencion = en_espera > 0
+
+    def registrar_llegada(self, ts):
+        if self.ultima_llegada is not None:
+            intervalo = (ts - self.ultima_llegada) / 60
+            if 0 < intervalo <= MAX_INTERVALO_MIN:
+                self.llegadas.agregar(intervalo)
+        self.ultima_llegada = ts
+
+    # ESTIMACIONES
+
+    def tiempo_servicio(self, tiempo_config):
+        """(media, desvío) en minutos por persona atendida"""
+        if self.servicio.n < self.min_observaciones:
+            return float(tiempo_config), 0.5 * tiempo_config
+        return self.servicio.media, math.sqrt(self.servicio.varianza)
+
+    def tasa_llegada(self):
+        """Personas por minuto (0 si todavía no hay datos)"""
+        if self.llegadas.n < self.min_observaciones or self.llegadas.media <= 0:
+            return 0.0
+        return 1.0 / self.llegadas.media
+
+    def minutos_hasta_alerta(self, personas, minutos_hasta_cierre, ventanillas, tiempo_config):
+        """Minutos hasta que la fila supere lo que las ventanillas atienden antes del cierre
+
+        Con tasa de atención μ y llegadas λ, la alerta llega cuando
+        personas + λ·t > μ·T (T = minutos hasta el cierre). 0 si ya se superó,
+        None si no ocurre antes del cierre.
+
+        El intervalo aprendido es entre atenciones de todas las ventanillas
+        juntas (ya incluye las que están abiertas); solo el tiempo configurado,
+        que es por ventanilla, se multiplica por la cantidad de ventanillas.
+        """
+        media, _ = self.tiempo_servicio(tiempo_config)
+        if media <= 0 or minutos_hasta_cierre <= 0:
+            return None
+        capacidad = minutos_hasta_cierre / media
+        if self.servicio.n < self.min_observaciones:
+            capacidad *= ventanillas
+        if personas > capacidad:
+            return 0.0
+        llegada = self.tasa_llegada()
+        if llegada <= 0:
+            return None
+        t = (capacidad - personas) / llegada
+        return t if t < minutos_hasta_cierre else None
+
+    def a_dict(self):
+        return {
+            'servicio': self.servicio.a_dict(),
+            'llegadas': self.llegadas.a_dict(),
+            'ultima_atencion': self.ultima_atencion,
+            'espera_tras_atencion': self.espera_tras_atencion,
+            'ultima_llegada': self.ultima_llegada
+        }
+
+    @classmethod
+    def desde_dict(cls, d, alfa=0.1, min_observaciones=5):
+        p = cls(alfa, min_observaciones)
+        if d:
+            p.servicio = PromedioExponencial.desde_dict(alfa, d['servicio'])
+            p.llegadas = PromedioExponencial.desde_dict(alfa, d['llegadas'])
+            p.ultima_atencion = d['ultima_atencion']
+            p.espera_tras_atencion = d.get('espera_tras_atencion', False)
+            p.ultima_llegada = d['ultima_llegada']
+        return p
+
+
+def espera_posicion(posicion, media, desvio):
+    """(p50, p90) de la espera en minutos de quien está en la posición indicada"""
+    delante = max(0, posicion - 1)
+    p50 = delante * media
+    return p50, p50 + Z_P90 * math.sqrt(delante) * desvio
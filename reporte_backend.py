@@ -0,0 +1,173 @@
+"""Reporte al backend en segundo plano (datos de segmento y frames)
+
+El bucle de inferencia solo deja el último valor de cada tipo en una cola
+acotada (el último gana) y nunca espera a la red. Un hilo de trabajo lo
+envía con un pool de conexiones keep-alive, reintentos con backoff y
+métricas de enviados, descartados y latencia.
+"""
+import threading
+import time
+
+import cv2
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ReporteBackend:
+    """Cliente HTTP persistente con cola 'el último gana' por (tipo, cámara)"""
+    def __init__(self, url_backend, max_intentos=3, backoff_inicial=0.2, backoff_max=5.0,
+                 timeout_datos=0.5, timeout_frame=0.3):
+        self.url_backend = url_backend
+        self.max_intentos = max_intentos
+        self.backoff_inicial = backoff_inicial
+        self.backoff_max = backoff_max
+        self.timeouts = {'datos': timeout_datos, 'frame': timeout_frame}
+
+        # Pool keep-alive compartido por todos los envíos
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._condicion = threading.Condition()
+        self._pendientes = {}       # (tipo, camera_id) -> payload (el último gana)
+        self._orden = []            # claves en orden de llegada
+        self._activo = True
+        self._reintentar_en = 0     # backoff global tras errores
+
+        self._offsets = {}          # camera_id -> offset devuelto por el backend
+        self._frames_multipart = False  # backend sin PUT /frames
+        self.ultimo_exito = {'datos': 0, 'frame': 0}
+        self._metricas = {
+            tipo: {'enviados': 0, 'descartados': 0, 'fallidos': 0,
+                   'latencia_ms_ultima': 0.0, 'latencia_ms_promedio': 0.0, 'latencia_ms_max': 0.0}
+            for tipo in ('datos', 'frame')
+        }
+
+        self._hilo = threading.Thread(target=self._bucle, name="reporte-backend", daemon=True)
+        self._hilo.start()
+
+    # API PARA EL BUCLE DE INFERENCIA (nunca bloquea)
+
+    def enviar_datos(self, datos):
+        """Encolar el estado del segmento (reemplaza el anterior sin enviar)"""
+        self._encolar(('datos', datos['camera_id']), datos)
+
+    def enviar_frame(self, camera_id, img):
+        """Encolar un frame; la compresión JPEG se hace en el hilo de envío"""
+        self._encolar(('frame', camera_id), img)
+
+    def offset(self, camera_id):
+        """Último offset de numeración global recibido para la cámara"""
+        return self._offsets.get(camera_id, 0)
+
+    @property
+    def pendientes(self):
+        return len(self._pendientes)
+
+    def metricas(self):
+        with self._condicion:
+            return {tipo: dict(m) for tipo, m in self._metricas.items()}
+
+    def detener(self, timeout=1.0):
+        with self._condicion:
+            self._activo = False
+            self._condicion.notify_all()
+        self._hilo.join(timeout=timeout)
+        self.session.close()
+
+    def _encolar(self, clave, payload):
+        with self._condicion:
+            if clave in self._pendientes:
+                self._metricas[clave[0]]['descartados'] += 1
+            else:
+                self._orden.append(clave)
+            self._pendientes[clave] = payload
+            self._condicion.notify()
+
+    # HILO DE ENVÍO
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                while self._activo and (not self._orden or time.time() < self._reintentar_en):
+                    espera = max(0.0, self._reintentar_en - time.time()) if self._orden else None
+                    self._condicion.wait(espera)
+                if not self._activo:
+                    return
+                clave = self._orden.pop(0)
+                payload = self._pendientes.pop(clave)
+
+            self._procesar(clave, payload)
+
+    def _procesar(self, clave, payload):
+        tipo, camera_id = clave
+        backoff = self.backoff_inicial
+
+        for intento in range(self.max_intentos):
+            if intento > 0:
+                # Si ya llegó un valor más nuevo, este reintento no tiene sentido
+                with self._condicion:
+                    if clave in self._pendientes or not self._activo:
+                        break
+                    self._condicion.wait(backoff)
+                    if clave in self._pendientes or not self._activo:
+                        break
+                backoff = min(self.backoff_max, backoff * 2)
+
+            inicio = time.time()
+            try:
+                if tipo == 'datos':
+                    self._post_datos(payload)
+                else:
+                    self._post_frame(camera_id, payload)
+                self._registrar_exito(tipo, (time.time() - inicio) * 1000)
+                return
+            except Exception:
+                pass
+
+        with self._condicion:
+            self._metricas[tipo]['fallidos'] += 1
+            # Backend caído: enfriar todo el envío un rato
+            self._reintentar_en = time.time() + backoff
+
+    def _registrar_exito(self, tipo, latencia_ms):
+        with self._condicion:
+            m = self._metricas[tipo]
+            m['enviados'] += 1
+            m['latencia_ms_ultima'] = latencia_ms
+            m['latencia_ms_promedio'] = (latencia_ms if m['enviados'] == 1
+                                         else 0.9 * m['latencia_ms_promedio'] + 0.1 * latencia_ms)
+            m['latencia_ms_max'] = max(m['latencia_ms_max'], latencia_ms)
+            self.ultimo_exito[tipo] = time.time()
+            self._reintentar_en = 0
+
+    def _post_datos(self, datos):
+        response = self.session.post(f"{self.url_backend}/segmento-fila", json=datos,
+                                     timeout=self.timeouts['datos'])
+        response.raise_for_status()
+        self._offsets[datos['camera_id']] = response.json().get('offset', 0)
+
+    def _post_frame(self, camera_id, img):
+        # Comprimir MUCHO más
+        small = cv2.resize(img, (320, 180), interpolation=cv2.INTER_AREA)
+
+        # Calidad JPEG más baja
+        ret, jpeg = cv2.imencode('.jpg', small, [int(cv2.IMWRITE_JPEG_QUALITY), 40])
+        if not ret:
+            return
+
+        # Ingesta binaria directa; multipart solo para backends anteriores
+        if not self._frames_multipart:
+            response = self.session.put(f"{self.url_backend}/frames/{camera_id}", data=jpeg.tobytes(),
+                                        headers={'Content-Type': 'image/jpeg'},
+                                        timeout=self.timeouts['frame'])
+            if response.status_code not in (404, 405):
+                response.raise_for_status()
+                return
+            self._frames_multipart = True
+
+        files = {'frame': ('frame.jpg', jpeg.tobytes(), 'image/jpeg')}
+        response = self.session.post(f"{self.url_backend}/upload-frame", files=files,
+                                     data={'camera_id': camera_id}, timeout=self.timeouts['frame'])
+        response.raise_for_status()
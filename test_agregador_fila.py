@@ -0,0 +1,43 @@
+import json
+
+from agregador_fila import AgregadorFila
+from estado_backend import EstadoMemoria
+
+
+def _segmento(camera_id, n, last_update):
+    return {
+        "camera_id": camera_id,
+        "personas_count": n,
+        "personas": [{"local_pos": i + 1, "centro_y": 10.0 * i, "confianza": 0.9} for i in range(n)],
+        "timestamp": last_update,
+        "last_update": last_update
+    }
+
+
+def test_offsets_totales_y_vencimiento():
+    estado = EstadoMemoria()
+    agregador = AgregadorFila(estado, vigencia=10)
+
+    estado.guardar_segmento(2, _segmento("cam_b", 3, 100.0))
+    estado.guardar_segmento(1, _segmento("cam_a", 2, 105.0))
+    assert agregador.sincronizar(ahora=106.0)
+    assert agregador.activos == [1, 2]
+    assert agregador.offset(1) == 0 and agregador.offset(2) == 2
+    assert agregador.total == 5
+
+    fila = json.loads(agregador.fila_completa_json((3.0, 0.0)))
+    assert [p['posicion'] for p in fila['personas']] == [1, 2, 3, 4, 5]
+    assert fila['personas'][2]['segmento'] == 2 and fila['personas'][2]['tiempo_espera_min'] == 6
+
+    # Sin cambios en el almacén ni vencimientos no se reconstruye
+    generacion = agregador.generacion
+    assert not agregador.sincronizar(ahora=109.0)
+    assert agregador.generacion == generacion
+
+    # El segmento 2 vence a los 10 s aunque nadie escriba
+    assert agregador.sincronizar(ahora=110.0)
+    assert agregador.activos == [1]
+    assert agregador.total == 2
+    assert agregador.offset(2) == 2
+    segmentos = json.loads(agregador.segmentos_json())['segmentos']
+    assert [(s['segmento'], s['activo']) for s in segmentos] == [(1, True), (2, False)]
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+# El histórico del módulo se crea al importarlo: que no escriba en el repo
+os.environ.setdefault('FILAS_HISTORICO_DIR', tempfile.mkdtemp())
+
+import backend
+from agregador_fila import AgregadorFila
+from estado_backend import EstadoMemoria
+from historico_filas import HistoricoFilas
+from pronostico_fila import PronosticoFila
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def time(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch, tmp_path):
+    reloj = Reloj()
+    estado = EstadoMemoria()
+    for clave, inicial in [
+        ('configuracion', dict(backend.CONFIGURACION_INICIAL)),
+        ('estadisticas', backend._estadisticas_vacias()),
+        ('personas_historico', {}),
+        ('handoffs_pendientes', []),
+        ('pronostico', PronosticoFila().a_dict()),
+        ('queue_ranking', {}),
+        ('ultimo_reseteo', '2024-01-01T00:00:00'),
+        ('alerta_ventanilla_mostrada', False),
+    ]:
+        estado.escribir(clave, inicial)
+
+    async def sin_reseteo():
+        pass
+
+    monkeypatch.setattr(backend, 'time', reloj)
+    monkeypatch.setattr(backend, '_estado', estado)
+    monkeypatch.setattr(backend, '_agregador', AgregadorFila(estado))
+    monkeypatch.setattr(backend, '_historico', HistoricoFilas(str(tmp_path)))
+    monkeypatch.setattr(backend, '_verificar_reseteo_diario', sin_reseteo)
+    return reloj
+
+
+def _tick(reloj, t, segmentos):
+    """Publicar {segmento: [local_id, ...]} (posición 1 primero) y correr el tracking en t"""
+    reloj.ahora = 1000.0 + t
+    for seg, ids in segmentos.items():
+        backend._estado.guardar_segmento(seg, {
+            "camera_id": f"cam{seg}",
+            "personas_count": len(ids),
+            "personas": [{"local_pos": i + 1, "local_id": id_, "centro_y": 0.0} for i, id_ in enumerate(ids)],
+            "timestamp": reloj.ahora,
+            "last_update": reloj.ahora
+        })
+    asyncio.run(backend._actualizar_tracking_personas(set(segmentos)))
+    return backend._estado.leer('personas_historico')
+
+
+def test_salida_y_luego_llegada_conserva_la_entrada(reloj):
+    _tick(reloj, 0, {1: [], 2: [7]})
+
+    # Sale por delante del segmento 2 y aparece en el 1 en el mismo tick
+    historico = _tick(reloj, 50, {1: [3], 2: []})
+    registro = historico['1']['cam1#3']
+    assert registro['entrada'] == 1000.0
+    assert registro['handoffs'] == 1 and registro['recorrido'] == [2, 1]
+    assert backend._estado.leer('handoffs_pendientes') == []
+
+    # Atendida en la cabeza: la espera cuenta desde que entró al segmento 2
+    _tick(reloj, 100, {1: [], 2: []})
+    estadisticas = backend._estado.leer('estadisticas')
+    assert estadisticas['personas_atendidas'] == 1
+    assert abs(estadisticas['tiempo_promedio_espera'] - 100 / 60) < 1e-9
+
+
+def test_llegada_procesada_antes_que_la_salida(reloj):
+    _tick(reloj, 0, {1: [], 2: [7]})
+
+    # El segmento 1 ya la ve mientras el 2 todavía no la soltó
+    historico = _tick(reloj, 50, {1: [3], 2: [7]})
+    assert historico['1']['cam1#3']['llegada_pendiente']
+
+    historico = _tick(reloj, 53, {1: [3], 2: []})
+    registro = historico['1']['cam1#3']
+    assert 'llegada_pendiente' not in registro
+    assert registro['entrada'] == 1000.0 and registro['recorrido'] == [2, 1]
+    assert backend._estado.leer('handoffs_pendientes') == []
+
+    # Una sola llegada a la fila, no dos
+    _tick(reloj, 80, {1: [3], 2: []})
+    assert backend._pronostico().ultima_llegada == 1000.0
+
+
+def test_varios_handoffs_pendientes_toma_el_segmento_mas_cercano(reloj):
+    _tick(reloj, 0, {1: [], 2: [20], 3: []})
+    _tick(reloj, 5, {1: [], 2: [20], 3: [30]})
+
+    # Salen a la vez por delante del 3 y del 2; al 1 solo puede llegar la del 2
+    historico = _tick(reloj, 40, {1: [10], 2: [], 3: []})
+    assert historico['1']['cam1#10']['entrada'] == 1000.0
+    assert historico['1']['cam1#10']['recorrido'] == [2, 1]
+    (pendiente,) = backend._estado.leer('handoffs_pendientes')
+    assert pendiente['segmento'] == 3
+
+    # La del 3 llega después al 2 con su propia entrada
+    historico = _tick(reloj, 42, {1: [10], 2: [21], 3: []})
+    assert historico['2']['cam2#21']['entrada'] == 1005.0
+    assert historico['2']['cam2#21']['recorrido'] == [3, 2]
+
+
+def test_ingesta_chunked_con_limite_y_ws_solo_binario(reloj):
+    cliente = TestClient(backend.app)
+
+    def cuerpo(partes):
+        for _ in range(partes):
+            yield b'x' * 65536
+
+    # Sin Content-Length: se corta al pasar MAX_FRAME_BYTES
+    assert cliente.put('/frames/cam_a', content=cuerpo(40)).status_code == 413
+    assert cliente.put('/frames/cam_a', content=cuerpo(2)).status_code == 202
+    assert len(backend._estado.frame('cam_a')[1]) == 2 * 65536
+
+    with cliente.websocket_connect('/ws/frames/cam_b') as ws:
+        ws.send_bytes(b'jpeg')
+        ws.send_text('hola')
+        assert ws.receive() == {'type': 'websocket.close', 'code': 1003, 'reason': ''}
+    assert backend._estado.frame('cam_b') == (1, b'jpeg')
+
+
+def test_atencion_del_tracking_llega_al_historico(reloj):
+    cliente = TestClient(backend.app)
+    _tick(reloj, 0, {1: [5]})
+    _tick(reloj, 90, {1: []})
+
+    # Sin sincronizar: /historico la toma de lo pendiente en memoria
+    datos = cliente.get('/historico', params={'desde': 0, 'hasta': 4000, 'resolucion': '1h'}).json()
+    (bucket,) = datos['serie']
+    assert bucket['atendidas'] == 1 and bucket['espera_promedio'] == 1.5
+
+    backend._historico.sincronizar(forzar=True)
+    datos_disco = cliente.get('/historico', params={'desde': 0, 'hasta': 4000, 'resolucion': '1h'}).json()
+    assert datos_disco['serie'] == datos['serie']
+
+
+def test_cliente_sse_que_no_consume_se_desconecta(reloj, monkeypatch):
+    difusor = backend.DifusorEventos()
+    monkeypatch.setattr(backend, '_difusor', difusor)
+    monkeypatch.setattr(backend, 'TIMEOUT_ENVIO_CLIENTE', 0.05)
+
+    class Pedido:
+        async def is_disconnected(self):
+            return False
+
+    async def correr():
+        respuesta = await backend.eventos(Pedido())
+        enviados = []
+
+        async def send(mensaje):
+            # Acepta la cabecera y el primer evento; después el socket no drena
+            if len(enviados) >= 2:
+                await asyncio.Event().wait()
+            enviados.append(mensaje)
+
+        await asyncio.wait_for(respuesta.stream_response(send), 1.0)
+        return enviados
+
+    enviados = asyncio.run(correr())
+    assert enviados[0]['type'] == 'http.response.start'
+    assert enviados[1]['body'] == b'retry: 3000\n\n'
+    assert difusor.suscriptores == 0
@@ -0,0 +1,34 @@
+import json
+import random
+
+import numpy as np
+
+from estadisticas_espera import CuantilP2, EstadisticasEspera
+
+
+def test_welford_y_p2_contra_numpy():
+    rng = random.Random(7)
+    muestras = [rng.lognormvariate(2.0, 0.6) for _ in range(5000)]
+
+    espera = EstadisticasEspera()
+    for i, m in enumerate(muestras):
+        espera.agregar(m, ts=1_700_000_000 + 60 * i)
+        # Ida y vuelta por JSON como en el almacén de estado
+        if i % 500 == 0:
+            espera = EstadisticasEspera.desde_dict(json.loads(json.dumps(espera.a_dict())))
+
+    r = espera.resumen()
+    assert r['atendidas'] == len(muestras)
+    assert abs(r['media'] - np.mean(muestras)) < 1e-9
+    assert abs(r['desvio'] - np.std(muestras, ddof=1)) < 1e-9
+    for clave, p in (('p50', 50), ('p90', 90), ('p99', 99)):
+        exacto = np.percentile(muestras, p)
+        assert abs(r[clave] - exacto) / exacto < 0.05
+    assert sum(b['atendidas'] for b in r['por_hora'].values()) == len(muestras)
+
+
+def test_p2_pocas_muestras_es_exacto():
+    c = CuantilP2(0.5)
+    for x in (4.0, 1.0, 3.0):
+        c.agregar(x)
+    assert c.valor() == 3.0
@@ -0,0 +1,100 @@
+import struct
+from datetime import datetime
+
+import numpy as np
+
+import historico_filas
+from historico_filas import (HistoricoFilas, DTYPE, FORMATO, LONGITUD, TAMANO_REGISTRO,
+                             pico_por_minuto)
+
+
+def _ts(hora, minuto, segundo=0):
+    return datetime(2024, 3, 4, hora, minuto, segundo).timestamp()
+
+
+def test_formato_de_registro():
+    assert TAMANO_REGISTRO == 17
+    assert DTYPE.itemsize == TAMANO_REGISTRO
+
+    registro = struct.pack(FORMATO, LONGITUD, 1709550000, 3, 12, 45.5, 6.0)
+    leido = np.frombuffer(registro, dtype=DTYPE)[0]
+    assert (leido['tipo'], leido['ts'], leido['segmento'], leido['n']) == (LONGITUD, 1709550000, 3, 12)
+    assert (leido['valor'], leido['maximo']) == (45.5, 6.0)
+
+
+def test_dos_escritores_y_minutos_parciales(tmp_path):
+    # Dos workers escriben el mismo día y uno fuerza un flush a mitad del minuto
+    a = HistoricoFilas(str(tmp_path))
+    b = HistoricoFilas(str(tmp_path))
+
+    a.registrar_longitud(_ts(9, 0, 0), 1, 4)
+    a.registrar_longitud(_ts(9, 0, 10), 2, 3)
+    a.sincronizar(forzar=True)
+    a.registrar_longitud(_ts(9, 0, 50), 2, 2)
+
+    b.registrar_longitud(_ts(9, 0, 5), 1, 4)
+    b.registrar_longitud(_ts(9, 0, 25), 1, 4)
+    b.registrar_atencion(_ts(9, 0, 55), 1, 6.0)
+
+    a.sincronizar(forzar=True)
+    b.sincronizar(forzar=True)
+
+    registros = a.leer_dia('2024-03-04')
+    assert len(registros) == 5
+
+    # Pico real: 4 (segmento 1) + 3 (segmento 2) en el mismo minuto
+    assert pico_por_minuto(registros) == 7
+
+    (bucket,) = a.consultar(_ts(9, 0), _ts(10, 0), '1h')
+    assert bucket['segmentos'] == {'1': {'promedio': 4.0, 'maximo': 4.0},
+                                   '2': {'promedio': 2.5, 'maximo': 3.0}}
+    assert bucket['personas_promedio'] == 6.5
+    assert bucket['atendidas'] == 1
+    assert bucket['espera_promedio'] == 6.0
+
+
+def test_consulta_incluye_lo_pendiente_sin_duplicar(tmp_path):
+    historico = HistoricoFilas(str(tmp_path), intervalo_fsync=3600)
+    historico.registrar_longitud(_ts(9, 0), 1, 2)
+    historico.cerrar_minutos(ahora=_ts(9, 1))
+    historico.sincronizar(forzar=True)
+
+    # Un minuto ya en el buffer y otro todavía abierto: nada escrito a disco
+    historico.registrar_longitud(_ts(9, 1), 1, 4)
+    historico.cerrar_minutos(ahora=_ts(9, 2))
+    historico.registrar_longitud(_ts(9, 2), 1, 6)
+    historico.registrar_atencion(_ts(9, 2, 30), 1, 3.0)
+
+    instantanea = historico.instantanea()
+    serie = historico.consultar(_ts(9, 0), _ts(9, 3), '1m', instantanea)
+    assert [b['segmentos']['1']['maximo'] for b in serie] == [2.0, 4.0, 6.0]
+    assert serie[2]['atendidas'] == 1
+
+    # Lo escrito después de la instantánea no se cuenta dos veces
+    historico.sincronizar(forzar=True)
+    assert historico.consultar(_ts(9, 0), _ts(9, 3), '1m', instantanea) == serie
+    assert historico.consultar(_ts(9, 0), _ts(9, 3), '1m', historico.instantanea()) == serie
+
+
+def test_instantanea_durante_una_escritura_en_otro_hilo(tmp_path, monkeypatch):
+    historico = HistoricoFilas(str(tmp_path))
+    historico.registrar_longitud(_ts(9, 0), 1, 2)
+    historico.sincronizar(forzar=True)
+    historico.registrar_longitud(_ts(9, 1), 1, 5)
+    historico.registrar_atencion(_ts(9, 1, 30), 1, 4.0)
+
+    # Consultar con los registros fuera del buffer pero todavía sin escribir
+    vistas = []
+    write = historico_filas.os.write
+
+    def write_con_consulta(fd, datos):
+        vistas.append(historico.consultar(_ts(9, 0), _ts(9, 2), '1m', historico.instantanea()))
+        return write(fd, datos)
+
+    monkeypatch.setattr(historico_filas.os, 'write', write_con_consulta)
+    historico.sincronizar(forzar=True)
+
+    final = historico.consultar(_ts(9, 0), _ts(9, 2), '1m', historico.instantanea())
+    assert vistas == [final]
+    assert [b['segmentos']['1']['maximo'] for b in final] == [2.0, 5.0]
+    assert final[1]['atendidas'] == 1
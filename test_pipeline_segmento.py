@@ -0,0 +1,396 @@
+import random
+
+import cv2
+import numpy as np
+
+from pipeline_segmento import (TrackerSegmento, ZonaFila, Preprocesador, PlanificadorDeteccion,
+                               DetectorMovimiento, filtrar_detecciones, recortes_zona)
+
+
+def _fusionar_referencia(detecciones, bboxes, confianzas, distancia_fusion):
+    """Implementación cuadrática original de la fusión madre-bebé"""
+    if len(detecciones) <= 1:
+        return detecciones, bboxes, confianzas
+
+    fusionadas = []
+    bboxes_f = []
+    confs_f = []
+    usadas = set()
+
+    for i, (c1, b1, conf1) in enumerate(zip(detecciones, bboxes, confianzas)):
+        if i in usadas:
+            continue
+
+        grupo_c = [c1]
+        grupo_b = [b1]
+        grupo_conf = [conf1]
+        usadas.add(i)
+
+        for j, (c2, b2, conf2) in enumerate(zip(detecciones, bboxes, confianzas)):
+            if j in usadas:
+                continue
+
+            dist = np.linalg.norm(np.array(c1) - np.array(c2))
+            if dist < distancia_fusion:
+                grupo_c.append(c2)
+                grupo_b.append(b2)
+                grupo_conf.append(conf2)
+                usadas.add(j)
+
+        if len(grupo_c) > 1:
+            idx = np.argmax(grupo_conf)
+            bbox_f = grupo_b[idx]
+            centro_f = (int((bbox_f[0]+bbox_f[2])/2), int(bbox_f[3]))
+            conf_f = grupo_conf[idx]
+        else:
+            centro_f = grupo_c[0]
+            bbox_f = grupo_b[0]
+            conf_f = grupo_conf[0]
+
+        fusionadas.append(centro_f)
+        bboxes_f.append(bbox_f)
+        confs_f.append(conf_f)
+
+    return fusionadas, bboxes_f, confs_f
+
+
+def _preprocesar_referencia(img):
+    """Preprocesado original a 1280x720: aspect ratio y padding en un canvas nuevo"""
+    h, w = img.shape[:2]
+    scale = min(1280 / w, 720 / h)
+    new_w, new_h = int(w * scale), int(h * scale)
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.zeros((720, 1280, 3), dtype=np.uint8)
+    x_offset = (1280 - new_w) // 2
+    y_offset = (720 - new_h) // 2
+    canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
+    return canvas
+
+
+def _filtrar_referencia(xyxy, conf, cls, umbral, zona, area_minima=400, aspect_min=0.8, aspect_max=5.0):
+    """Filtro original caja por caja del bucle de detector_segmento.py"""
+    centros, bboxes, confianzas = [], [], []
+    detecciones_brutas = 0
+    for caja, c, k in zip(xyxy, conf, cls):
+        if int(k) != 0:
+            continue
+        detecciones_brutas += 1
+        x1, y1, x2, y2 = map(int, caja)
+        c = float(c)
+        if c <= umbral:
+            continue
+        ancho = x2 - x1
+        alto = y2 - y1
+        area = ancho * alto
+        aspect_ratio = alto / ancho if ancho > 0 else 0
+        if area < area_minima:
+            continue
+        if ancho < 30 or alto < 40:
+            continue
+        if aspect_ratio < aspect_min or aspect_ratio > aspect_max:
+            continue
+        if ancho > 600 or alto > 900:
+            continue
+        cx = int((x1 + x2) / 2)
+        cy = int(y2)
+        if zona.contiene(cx, cy):
+            centros.append((cx, cy))
+            bboxes.append((x1, y1, x2, y2))
+            confianzas.append(c)
+    return centros, bboxes, confianzas, detecciones_brutas
+
+
+def _detecciones_desde_bboxes(bboxes):
+    return [(int((b[0]+b[2])/2), int(b[3])) for b in bboxes]
+
+
+# Listas grabadas de frames reales (bboxes xyxy + confianza)
+FRAMES_GRABADOS = [
+    # Fila de mañana: madre con bebé en brazos y dos personas solapadas
+    (
+        [(612, 288, 731, 702), (655, 402, 712, 560), (488, 210, 571, 520),
+         (402, 160, 470, 431), (371, 150, 433, 402), (250, 95, 301, 300)],
+        [0.91, 0.47, 0.83, 0.66, 0.66, 0.38],
+    ),
+    # Frame con detecciones en el borde de distancia_fusion (80 px)
+    (
+        [(100, 100, 160, 300), (180, 100, 240, 300), (259, 100, 319, 300),
+         (100, 400, 160, 600), (100, 480, 160, 680)],
+        [0.7, 0.7, 0.9, 0.5, 0.55],
+    ),
+    # Frame vacío y frame de una sola persona
+    ([], []),
+    ([(640, 300, 720, 690)], [0.88]),
+]
+
+
+def _comparar(detecciones, bboxes, confianzas, distancia_fusion=80):
+    tracker = TrackerSegmento(distancia_fusion=distancia_fusion)
+    esperado = _fusionar_referencia(detecciones, bboxes, confianzas, distancia_fusion)
+    obtenido = tracker._fusionar_detecciones(detecciones, bboxes, confianzas)
+    assert [list(x) for x in obtenido] == [list(x) for x in esperado]
+
+
+def test_fusion_paridad_frames_grabados():
+    for bboxes, confianzas in FRAMES_GRABADOS:
+        _comparar(_detecciones_desde_bboxes(bboxes), bboxes, confianzas)
+
+
+def test_fusion_paridad_fila_densa_aleatoria():
+    rng = random.Random(1234)
+    for _ in range(300):
+        n = rng.randint(0, 50)
+        bboxes = []
+        for _ in range(n):
+            x1 = rng.randint(0, 1200)
+            y1 = rng.randint(0, 600)
+            bboxes.append((x1, y1, x1 + rng.randint(30, 150), y1 + rng.randint(40, 300)))
+        # Confianzas redondeadas para forzar empates
+        confianzas = [round(rng.uniform(0.2, 1.0), 1) for _ in range(n)]
+        _comparar(_detecciones_desde_bboxes(bboxes), bboxes, confianzas,
+                  distancia_fusion=rng.choice([40, 80, 150]))
+
+
+def test_filtrar_detecciones_igual_al_filtro_por_caja():
+    rng = np.random.default_rng(3)
+    zona = ZonaFila([[300, 700], [1000, 700], [900, 150], [400, 150]])
+
+    for _ in range(200):
+        n = int(rng.integers(0, 40))
+        x1 = rng.uniform(0, 1250, n)
+        y1 = rng.uniform(0, 700, n)
+        # Anchos y altos alrededor de cada umbral (0, 30/40, área, proporción, 600/900)
+        ancho = rng.choice([0.0, 29.5, 30.0, 45.0, 80.0, 200.0, 601.0], n) + rng.uniform(0, 3, n)
+        alto = rng.choice([39.0, 40.0, 60.0, 150.0, 400.0, 901.0], n) + rng.uniform(0, 3, n)
+        xyxy = np.stack([x1, y1, x1 + ancho, y1 + alto], axis=1)
+        conf = rng.choice([0.2, 0.5, 0.5000001, 0.9], n).astype(np.float32)
+        cls = rng.choice([0, 0, 0, 1, 2], n).astype(np.float32)
+
+        esperado = _filtrar_referencia(xyxy, conf, cls, 0.5, zona)
+        obtenido = filtrar_detecciones(xyxy, conf, cls, 0.5, zona)
+        assert obtenido == esperado
+
+
+def test_hungaro_respeta_distancia_max():
+    tracker = TrackerSegmento(distancia_max=100)
+    tracker.actualizar([(0, 300), (100, 300)])
+
+    # Sin gating lo óptimo sería 0→60 y 100→210 (110 px, fuera del límite):
+    # con gating 100 toma la de 60, 0 queda sin detección y 210 es un track nuevo
+    tracker.actualizar([(60, 300), (210, 300)])
+    assert tracker.objects == {0: (0, 300), 1: (60, 300), 2: (210, 300)}
+    assert tracker.disappeared == {0: 1, 1: 0, 2: 0}
+
+    # Una detección a más de distancia_max de todos nunca se asigna
+    tracker.actualizar([(500, 300)])
+    assert tracker.objects[3] == (500, 300)
+    assert tracker.disappeared[1] == 1 and tracker.disappeared[2] == 1
+
+
+def test_hungaro_y_greedy_coinciden_en_escenas_sin_ambiguedad():
+    rng = random.Random(11)
+    for _ in range(30):
+        hungaro = TrackerSegmento(distancia_max=100)
+        greedy = TrackerSegmento(distancia_max=100, matching='greedy')
+
+        # Personas a 300 px o más entre sí, con ruido de pocos px por frame
+        personas = [(x, y) for x in range(100, 1200, 300) for y in range(100, 700, 300)]
+        rng.shuffle(personas)
+        personas = personas[:rng.randint(1, len(personas))]
+
+        for _ in range(10):
+            personas = [(x + rng.randint(-10, 10), y + rng.randint(-10, 10)) for x, y in personas]
+            detecciones = [p for p in personas if rng.random() > 0.2]
+            rng.shuffle(detecciones)
+
+            hungaro.actualizar(list(detecciones))
+            greedy.actualizar(list(detecciones))
+            assert hungaro.objects == greedy.objects
+            assert hungaro.disappeared == greedy.disappeared
+
+
+def test_tabla_tracks_reutiliza_slots_y_mantiene_vistas():
+    tracker = TrackerSegmento(max_disappeared=1, capacidad=2)
+    bboxes = [(70, 100, 130, 300), (370, 100, 430, 300), (670, 100, 730, 300)]
+    tracker.actualizar(_detecciones_desde_bboxes(bboxes), bboxes, [0.9, 0.8, 0.7])
+
+    assert tracker.objects == {0: (100, 300), 1: (400, 300), 2: (700, 300)}
+    assert tracker.bboxes[2] == (670, 100, 730, 300)
+    assert tracker.velocidades[1] == (0.0, 0.0)
+
+    # Solo la persona 1 sigue visible: 0 y 2 se podan tras max_disappeared
+    for _ in range(2):
+        tracker.actualizar([(410, 300)], [(380, 100, 440, 300)], [0.8])
+    assert list(tracker.objects) == [1]
+    assert tracker.velocidades[1][0] > 0
+
+    # Los slots liberados se reutilizan para ids nuevos
+    slots_previos = len(tracker._ids)
+    tracker.actualizar([(410, 300), (900, 300)], [(380, 100, 440, 300), (870, 100, 930, 300)], [0.8, 0.6])
+    assert list(tracker.objects) == [1, 3]
+    assert len(tracker._ids) == slots_previos
+
+
+def test_preprocesador_letterbox_y_coordenadas_canonicas():
+    rng = np.random.default_rng(7)
+    pre = Preprocesador(imgsz=640)
+    assert pre.tamano_entrada == (640, 384)
+
+    for w, h in [(640, 480), (1920, 1080), (320, 240), (720, 1280)]:
+        img = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+        entrada = pre.entradas(img)[0]
+        assert entrada.shape == (384, 640, 3)
+        assert np.array_equal(pre.canonico(img), _preprocesar_referencia(img))
+
+        # Un punto del frame original cae en el mismo lugar que en el canvas 1280x720
+        x, y = w * 0.3, h * 0.7
+        escala_m = min(640 / w, 384 / h)
+        escala_c = min(1280 / w, 720 / h)
+        xm = x * escala_m + (640 - int(w * escala_m)) // 2
+        ym = y * escala_m + (384 - int(h * escala_m)) // 2
+        xc = x * escala_c + (1280 - int(w * escala_c)) // 2
+        yc = y * escala_c + (720 - int(h * escala_c)) // 2
+        caja = pre.a_canonico([[xm, ym, xm, ym]])[0]
+        assert np.allclose(caja, [xc, yc, xc, yc])
+
+    # El canvas reutilizado no arrastra el dibujo del frame anterior
+    pre.canonico(img)[:] = 255
+    assert np.array_equal(pre.canonico(np.zeros((480, 640, 3), dtype=np.uint8)), np.zeros((720, 1280, 3), dtype=np.uint8))
+
+
+class _Cajas:
+    def __init__(self, xyxy, conf):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.cls = np.zeros(len(conf), dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+
+class _Resultado:
+    def __init__(self, xyxy, conf):
+        self.boxes = _Cajas(xyxy, conf)
+
+
+def test_recortes_roi_y_detecciones_en_coordenadas_canonicas():
+    # Fila diagonal: de la ventanilla (abajo a la derecha) hacia arriba a la izquierda
+    zona = ZonaFila([[700, 700], [760, 640], [200, 120], [140, 180]])
+
+    (recorte,) = recortes_zona(zona, margen=20)
+    assert recorte == (120, 0, 781, 720)
+    assert recortes_zona(zona, margen=20, alto_persona=50)[0] == (120, 50, 781, 720)
+
+    mosaicos = recortes_zona(zona, margen=20, mosaicos=3)
+    assert len(mosaicos) == 3
+    assert all((x2 - x1) * (y2 - y1) < (781 - 120) * 720 for x1, y1, x2, y2 in mosaicos)
+
+    # Frame de 1920x1080: una persona del frame se ve en cada recorte que la contiene
+    pre = Preprocesador(imgsz=640, recortes=mosaicos)
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    entradas = pre.entradas(frame)
+    assert len({e.shape for e in entradas}) == 1
+
+    caja_canonica = np.array([400.0, 200.0, 460.0, 380.0])
+    resultados = []
+    for i, (x1, y1, x2, y2) in enumerate(mosaicos):
+        factor, dx, dy = pre._transformaciones[i]
+        en_entrada = (caja_canonica - [dx, dy, dx, dy]) / factor
+        resultados.append(_Resultado([en_entrada], [0.8 + 0.01 * i]))
+
+    xyxy, conf, cls = pre.detecciones(resultados)
+    assert len(xyxy) == 1
+    assert np.allclose(xyxy[0], caja_canonica, atol=1e-3)
+
+
+def test_prediccion_entre_detecciones_mantiene_velocidad_por_frame():
+    # Persona que camina 4 px/frame en x; con y sin frames salteados
+    continuo = TrackerSegmento()
+    salteado = TrackerSegmento()
+    for frame in range(13):
+        x = 100 + 4 * frame
+        deteccion = ([(x, 300)], [(x - 30, 100, x + 30, 300)], [0.9])
+        continuo.actualizar(*deteccion)
+        if frame % 3 == 0:
+            salteado.actualizar(*deteccion)
+        else:
+            salteado.predecir()
+
+    assert list(salteado.objects) == [0]
+    assert salteado.disappeared[0] == 0
+    assert np.allclose(salteado.velocidades[0], continuo.velocidades[0], atol=0.5)
+
+    # Entre detecciones el track avanza con su velocidad (bbox incluida)
+    # (última detección en x=148, velocidad suavizada ~3.97 px/frame)
+    salteado.predecir()
+    assert salteado.objects[0] == (151, 300)
+    assert salteado.bboxes[0] == (122, 100, 182, 300)
+
+
+def test_planificador_salta_con_fila_quieta_y_vuelve_con_movimiento():
+    planificador = PlanificadorDeteccion(k_max=4)
+    for _ in range(40):
+        if planificador.detectar_ahora():
+            planificador.registrar([(0.1, 0.0), (0.0, 0.2)], 3)
+    assert planificador.k == 4
+    assert planificador.salteados > planificador.detectados
+
+    # Alguien camina rápido: se vuelve a detectar en cada frame
+    planificador.registrar([(20.0, 0.0)], 3)
+    assert planificador.k == 1
+
+    # Cambio sostenido de conteo (entra una persona): también
+    planificador.k = 4
+    planificador.registrar([], 4)
+    planificador.registrar([], 4)
+    assert planificador.k > 1
+    planificador.registrar([], 4)
+    assert planificador.k == 1
+
+
+def test_planificador_tolera_conteos_ruidosos_y_tracks_perdidos():
+    rng = random.Random(7)
+    planificador = PlanificadorDeteccion(k_max=6)
+    for _ in range(300):
+        if planificador.detectar_ahora():
+            # YOLO parpadea: a veces una persona menos o una de más
+            conteo = 5 + (rng.choice([-1, 1]) if rng.random() < 0.2 else 0)
+            planificador.registrar(np.array([(0.2, 0.1)] * 5), conteo)
+    assert planificador.k == 6
+    assert planificador.salteados > 3 * planificador.detectados
+
+    # La velocidad vieja de un track perdido no cuenta
+    tracker = TrackerSegmento()
+    tracker.actualizar([(100, 300), (600, 300)], [(70, 100, 130, 300), (570, 100, 630, 300)], [0.9, 0.9])
+    tracker.actualizar([(140, 300), (600, 300)], [(110, 100, 170, 300), (570, 100, 630, 300)], [0.9, 0.9])
+    tracker.actualizar([(600, 300)], [(570, 100, 630, 300)], [0.9])
+    assert tracker.velocidades[0][0] > 20
+    assert np.allclose(tracker.velocidades_vistas(), [(0.0, 0.0)])
+
+
+def test_compuerta_de_movimiento_solo_mira_la_zona():
+    zona = ZonaFila([[0, 360], [640, 360], [640, 720], [0, 720]])
+    movimiento = DetectorMovimiento(zona, sensibilidad=0.01, intervalo_max=10.0)
+    frame = np.full((720, 1280, 3), 80, dtype=np.uint8)
+
+    # El primer frame siempre infiere; después, escena quieta
+    assert movimiento.hay_movimiento(frame, ahora=0.0)
+    assert not movimiento.hay_movimiento(frame.copy(), ahora=1.0)
+
+    # Movimiento fuera de la zona (arriba a la derecha): no cuenta
+    afuera = frame.copy()
+    afuera[0:300, 800:1200] = 255
+    assert not movimiento.hay_movimiento(afuera, ahora=2.0)
+
+    # Una persona entra a la zona
+    adentro = frame.copy()
+    adentro[450:700, 200:280] = 20
+    assert movimiento.hay_movimiento(adentro, ahora=3.0)
+    assert not movimiento.hay_movimiento(adentro, ahora=4.0)
+
+    # Aunque nada cambie, se reconfirma cada intervalo_max segundos
+    assert movimiento.hay_movimiento(adentro, ahora=13.5)
+    assert movimiento.salteados == 3
@@ -0,0 +1,63 @@
+import json
+
+from pronostico_fila import PronosticoFila, espera_posicion
+
+
+def test_tasas_aprendidas_y_tiempo_hasta_alerta():
+    p = PronosticoFila()
+    # Sin datos se usa el tiempo configurado
+    assert p.tiempo_servicio(3) == (3.0, 1.5)
+    assert p.minutos_hasta_alerta(10, 60, 1, 3) is None
+    # El tiempo configurado es por ventanilla: 60/3 = 20 personas por ventanilla
+    assert p.minutos_hasta_alerta(25, 60, 1, 3) == 0.0
+    assert p.minutos_hasta_alerta(25, 60, 2, 3) is None
+
+    for i in range(20):
+        p.registrar_atencion(1000 + i * 120, 3)  # una atención cada 2 min con fila
+        p.registrar_llegada(1000 + i * 100)      # una llegada cada 100 s
+    p = PronosticoFila.desde_dict(json.loads(json.dumps(p.a_dict())))
+
+    media, desvio = p.tiempo_servicio(3)
+    assert abs(media - 2.0) < 1e-9 and desvio < 1e-6
+    assert abs(p.tasa_llegada() - 0.6) < 1e-9
+
+    # Capacidad 60/2 = 30 personas; 10 en fila + 0.6/min llegan a 30 en 33.3 min
+    assert abs(p.minutos_hasta_alerta(10, 60, 1, 3) - 100 / 3) < 1e-6
+    assert p.minutos_hasta_alerta(40, 60, 1, 3) == 0.0
+    # El intervalo aprendido ya es el de todas las ventanillas juntas
+    assert p.minutos_hasta_alerta(10, 60, 2, 3) == p.minutos_hasta_alerta(10, 60, 1, 3)
+
+    # Una pausa larga no se toma como tiempo de atención
+    p.registrar_atencion(1000 + 19 * 120 + 3600, 3)
+    assert abs(p.tiempo_servicio(3)[0] - 2.0) < 1e-9
+
+
+def test_carga_liviana_no_cuenta_tiempo_ocioso():
+    p = PronosticoFila(min_observaciones=3)
+
+    # Una persona cada 10 min, atendida en 2 min, y la fila queda vacía:
+    # los intervalos de 10 min son casi todo tiempo ocioso
+    for i in range(6):
+        p.registrar_atencion(1000 + i * 600, 0)
+    assert p.servicio.n == 0
+    assert p.tiempo_servicio(3) == (3.0, 1.5)
+
+    # Con gente esperando el intervalo sí es tiempo de atención
+    inicio = 1000 + 6 * 600
+    for i in range(5):
+        p.registrar_atencion(inicio + i * 120, 4 - i)
+    assert p.servicio.n == 4
+    assert abs(p.tiempo_servicio(3)[0] - 2.0) < 1e-9
+
+    # La última dejó la fila vacía: la siguiente 20 min después no cuenta
+    p.registrar_atencion(inicio + 4 * 120 + 1200, 0)
+    assert p.servicio.n == 4
+
+    restaurado = PronosticoFila.desde_dict(json.loads(json.dumps(p.a_dict())), min_observaciones=3)
+    assert restaurado.espera_tras_atencion is False
+
+
+def test_espera_por_posicion():
+    assert espera_posicion(1, 2.0, 1.0) == (0.0, 0.0)
+    p50, p90 = espera_posicion(5, 2.0, 1.0)
+    assert p50 == 8.0 and abs(p90 - (8.0 + 1.2816 * 2.0)) < 1e-9
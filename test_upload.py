@@ -17,6 +17,14 @@ try:
 except Exception as e:
     print('Error al POST /upload-frame:', e)
 
+# Subir la misma imagen por la ingesta binaria (sin multipart)
+try:
+    with open('test.jpg','rb') as f:
+        r = requests.put('http://127.0.0.1:8000/frames/cam_interior', data=f.read(), headers={'Content-Type':'image/jpeg'}, timeout=5)
+        print('PUT /frames/cam_interior ->', r.status_code)
+except Exception as e:
+    print('Error al PUT /frames:', e)
+
 # Consultar /cameras
 try:
     r2 = requests.get('http://127.0.0.1:8000/cameras', timeout=5)